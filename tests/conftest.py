@@ -0,0 +1,31 @@
+import pytest
+
+from tirganach.fields import IntegerField
+from tirganach.structure import GameData
+
+
+def synthetic(rows: int = 30) -> bytes:
+	# a file of the current layout, row n of every table has n as its integer primary keys and zeros otherwise
+	# items get a type so that their subtype can be read
+	result = bytearray(20)
+	for table_name, entity_type in GameData.schema().entity_types.items():
+		row_length = entity_type._length()
+		body = bytearray()
+		for n in range(1, rows + 1):
+			row = bytearray(row_length)
+			for field_info in entity_type._fields.values():
+				if field_info.primary and isinstance(field_info, IntegerField) and n <= field_info.value_range()[1]:
+					row[field_info.offset: field_info.offset+field_info.len_bytes] = n.to_bytes(length=field_info.len_bytes, byteorder='little')
+			if table_name == 'items':
+				field_info = entity_type._fields['item_type']
+				row[field_info.offset] = 1
+				field_info = entity_type._fields['selling_price']
+				row[field_info.offset: field_info.offset+field_info.len_bytes] = (n * 37 % 100).to_bytes(length=field_info.len_bytes, byteorder='little')
+			body += row
+		result += bytes(6) + len(body).to_bytes(length=4, byteorder='little') + bytes(2) + body
+	return bytes(result)
+
+
+@pytest.fixture
+def game_data() -> GameData:
+	return GameData(synthetic(), verify=False)
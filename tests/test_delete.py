@@ -0,0 +1,31 @@
+from tirganach.types import School
+
+
+def test_cascade_only_takes_owned_rows(game_data):
+	# Creature.skills finds the skills of the stats with the creature's id, they belong to the stats
+	creature = game_data.creatures.where(creature_id=2)[0]
+	creature.stats_id = 1
+	skill = game_data.creature_skills.new(stats_id=2, skill_school=School.FIRE, skill_level=5)
+	assert creature.skills == [skill]
+
+	removed = game_data.delete(creature)
+	assert 'creature_skills' not in removed
+	assert game_data.creature_skills.where(stats_id=2) == [skill]
+
+
+def test_cascade_takes_item_ui_and_effects(game_data):
+	item = game_data.items.where(item_id=3)[0]
+	game_data.delete(game_data.weapons.where(item_id=3)[0])
+	ui = game_data.item_ui.new(item_id=3, item_ui_handle='icon')
+	effect = game_data.item_effects.new(item_id=3, effect_id=7)
+
+	removed = game_data.delete(item)
+	assert removed['item_ui'] == [ui]
+	assert removed['item_effects'] == [effect]
+
+
+def test_deleted_ids_are_not_reused(game_data):
+	item = game_data.items.where(item_id=1)[0]
+	game_data.item_ui.new(item_id=1, item_ui_handle='icon')
+	game_data.delete(item, cascade=False)
+	assert game_data.items.new(item_type=item.item_type).item_id != 1
@@ -0,0 +1,34 @@
+import copy
+import pickle
+
+import pytest
+
+from tirganach import SharedGameData
+
+
+def test_copies_stay_attached(game_data):
+	item = game_data.items.where(item_id=1)[0]
+	for duplicate in (copy.copy(item), copy.deepcopy(item)):
+		assert duplicate is not item
+		assert duplicate._game_data is game_data
+		assert duplicate.item_id == item.item_id
+		assert duplicate.name == item.name
+		duplicate.selling_price = 12345
+		assert item.selling_price != 12345
+
+
+def test_pickled_rows_are_detached(game_data):
+	item = pickle.loads(pickle.dumps(game_data.items.where(item_id=1)[0]))
+	assert item._game_data is None
+
+
+def test_shared_rows_refuse_every_write(game_data, tmp_path):
+	shared = SharedGameData.create(game_data, tmp_path / 'shared')
+	try:
+		row = shared.items[0]
+		with pytest.raises(PermissionError):
+			row.selling_price = 5
+		with pytest.raises(PermissionError):
+			row.set(selling_price=5)
+	finally:
+		shared.close()
@@ -0,0 +1,24 @@
+import pytest
+
+from tirganach.entities import Entity
+from tirganach.fields import IntegerField, Relation
+from tirganach.structure import GameData, Table
+
+
+def test_every_relation_is_compiled():
+	schema = GameData.schema()
+	for relations in schema.relations.values():
+		for relation in relations.values():
+			assert relation.target_type is schema.entity_types[relation.table_name]
+
+
+def test_relation_to_unknown_table():
+	class Broken(Entity):
+		broken_id: int = IntegerField(0, 2, primary=True)
+		creature = Relation('creature', {'creature_id': 'broken_id'})
+
+	class BrokenGameData(GameData):
+		broken: Table[Broken]
+
+	with pytest.raises(ValueError, match="Broken.creature refers to table 'creature'"):
+		BrokenGameData.schema()
@@ -0,0 +1,19 @@
+import pytest
+
+from tirganach.entities import Item
+from tirganach.server import RequestError, _parse_value
+from tirganach.types import EquipmentType, ItemType, RuneRace
+
+
+def test_enum_values_by_name():
+	assert _parse_value(Item._fields['item_type'], 'equipment') is ItemType.EQUIPMENT
+	# the type of a subtype depends on the item type, any of them will do
+	assert _parse_value(Item._fields['item_subtype'], 'RING') is EquipmentType.RING
+	assert _parse_value(Item._fields['item_subtype'], 'ELVES') is RuneRace.ELVES
+
+
+@pytest.mark.parametrize('field, text', [('item_type', 'WEAPON'), ('item_subtype', 'SWORD')])
+def test_unknown_enum_names(field, text):
+	with pytest.raises(RequestError) as error:
+		_parse_value(Item._fields[field], text)
+	assert error.value.status == 400
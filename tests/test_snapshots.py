@@ -0,0 +1,21 @@
+from tirganach.structure import GameData
+
+
+def test_write_after_undoing_delete(game_data):
+	game_data.items.create_range_index('selling_price')
+	snapshot = game_data.snapshot()
+	row = snapshot.items[1]
+	key = row.item_id
+	digest = snapshot.digest()
+	del snapshot.items[1]
+	snapshot.undo()
+
+	row.item_id = 2000
+	assert snapshot.items.where(item_id=2000) == [row]
+	assert snapshot.items.where(item_id=key) == []
+	row.selling_price = 999
+	prices = [item.selling_price for item in snapshot.items.ordered('selling_price')]
+	assert prices == sorted(prices)
+	assert snapshot.digest() != digest
+	assert snapshot.digest() == GameData(bytes(snapshot._to_bytes()), verify=False).digest()
+	assert game_data.items.where(item_id=key)[0].selling_price != 999
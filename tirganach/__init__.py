@@ -1 +1,7 @@
-from .structure import GameData, GameData154, GameData161, GameData154EN, GameData154RU, GameData154PL
+from .structure import Validation, GameData, GameData154, GameData161, GameData154EN, GameData154RU, GameData154PL
+from .catalog import catalog
+from .versions import open, identify, fingerprint, register_version
+from .query import col
+from .shared import SharedGameData
+from .scan import scan
+from .merge import merge
@@ -1,2 +1,37 @@
+import argparse
+import sys
 
+from tirganach.build import build, print_report, DEFAULT_OUTPUT
+from tirganach.server import serve
 
+
+parser = argparse.ArgumentParser(prog='python -m tirganach')
+commands = parser.add_subparsers(dest='command', required=True)
+
+serve_parser = commands.add_parser('serve', help="answer queries about a GameData.cff over local http")
+serve_parser.add_argument('source', help="path to GameData.cff")
+serve_parser.add_argument('--host', default='127.0.0.1')
+serve_parser.add_argument('--port', type=int, default=8151)
+serve_parser.add_argument('--cache', type=int, default=256, help="number of responses to keep")
+
+build_parser = commands.add_parser('build', help="apply mod scripts to base files, in parallel")
+build_parser.add_argument('bases', nargs='+', help="paths to the GameData.cff files to start from")
+build_parser.add_argument('-s', '--script', action='append', default=[], dest='scripts', help="mod.py, mod.py:function or package.module[:function], in order (function defaults to apply)")
+build_parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT, help="where to write each build, can use {name}, {stem}, {dir} and {version} (default: %(default)s)")
+build_parser.add_argument('-j', '--jobs', type=int, default=None, help="number of processes (default: one per cpu)")
+build_parser.add_argument('--no-check', dest='check', action='store_false', help="skip the integrity check")
+build_parser.add_argument('--strict', action='store_true', help="fail builds that leave new dangling references")
+
+args = parser.parse_args()
+if args.command == 'serve':
+	serve(args.source, host=args.host, port=args.port, cache_size=args.cache)
+elif args.command == 'build':
+	try:
+		reports = build(args.bases, args.scripts, output=args.output, jobs=args.jobs, check=args.check, strict=args.strict, done=print_report)
+	except ValueError as e:
+		parser.error(str(e))
+	failed = [report for report in reports if report.failed]
+	print(f"{len(reports) - len(failed)} built, {len(failed)} failed")
+	for report in failed:
+		print(f"  {report.base}: {report.failed.name} failed")
+	sys.exit(1 if failed else 0)
@@ -0,0 +1,209 @@
+import importlib
+import importlib.util
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from os import PathLike
+from typing import Callable, Type
+
+from tirganach.structure import GameData
+
+
+# applies a chain of mod scripts to several base files, each file in a process of its own
+# a script is a function taking the GameData, given as 'path/to/mod.py' or 'package.module' (calling its apply)
+# or with the function name after a colon, 'path/to/mod.py:rebalance'
+# outputs are written to a temporary file next to them first, so a failed build never leaves half a file behind
+
+DEFAULT_OUTPUT = os.path.join('build', '{version}', '{name}')
+
+
+class BuildStep:
+	name: str
+	seconds: float
+	error: str | None # the traceback, if the step failed
+
+	def __init__(self, name: str, seconds: float, error: str = None):
+		self.name = name
+		self.seconds = seconds
+		self.error = error
+
+	def __repr__(self):
+		return f"<[BuildStep] {self.name}: {'failed' if self.error else f'{self.seconds:.2f}s'}>"
+
+
+class BuildReport:
+	base: str
+	output: str | None # None if the base couldn't be identified
+	version: str | None # name of the identified GameData class
+	steps: list[BuildStep]
+	dangling: dict[str, tuple[int, int]] # relation -> dangling references before and after the scripts, where there are more now
+
+	def __init__(self, base: str, output: str):
+		self.base = base
+		self.output = output
+		self.version = None
+		self.steps = []
+		self.dangling = {}
+
+	def __repr__(self):
+		return f"<[BuildReport] {self.base}: {'failed' if self.failed else 'ok'}>"
+
+	@property
+	def failed(self) -> BuildStep | None:
+		return next((step for step in self.steps if step.error), None)
+
+	@property
+	def seconds(self) -> float:
+		return sum(step.seconds for step in self.steps)
+
+
+def load_script(script: str | Callable[[GameData], None]) -> Callable[[GameData], None]:
+	if callable(script):
+		return script
+	location, _, function_name = script.partition(':')
+	if location.endswith('.py'):
+		module_name = os.path.splitext(os.path.basename(location))[0]
+		spec = importlib.util.spec_from_file_location(module_name, location)
+		if spec is None:
+			raise ValueError(f"Cannot load {location}")
+		module = importlib.util.module_from_spec(spec)
+		spec.loader.exec_module(module)
+	else:
+		module = importlib.import_module(location)
+	function = getattr(module, function_name or 'apply', None)
+	if not callable(function):
+		raise ValueError(f"{location} has no function {function_name or 'apply'}")
+	return function
+
+
+def _script_name(script: str | Callable) -> str:
+	return script if isinstance(script, str) else getattr(script, '__qualname__', repr(script))
+
+
+def output_path(base: str | PathLike[str], output: str = DEFAULT_OUTPUT, version: str = None) -> str:
+	# output: format string with {name} and {stem} of the base file, {dir} it's in and {version}
+	base = os.fspath(base)
+	if version is None:
+		from tirganach.versions import identify
+		version = identify(base).__name__
+	name = os.path.basename(base)
+	return os.path.normpath(output.format(name=name, stem=os.path.splitext(name)[0], dir=os.path.dirname(base) or '.', version=version))
+
+
+def build_file(base: str | PathLike[str], scripts: list, output: str, check: bool = True, strict: bool = False, game_data_class: Type[GameData] = None) -> BuildReport:
+	# never raises, whatever goes wrong ends up in the report
+	# game_data_class: the version of the base if it's already known, saves identifying it again
+	from tirganach.versions import identify
+	report = BuildReport(os.fspath(base), output)
+	game_data = None
+	dangling = {}
+
+	def step(name: str, work: Callable):
+		start = time.perf_counter()
+		try:
+			work()
+		except Exception:
+			report.steps.append(BuildStep(name, time.perf_counter() - start, traceback.format_exc()))
+			return False
+		report.steps.append(BuildStep(name, time.perf_counter() - start))
+		return True
+
+	def load():
+		nonlocal game_data
+		game_data = (game_data_class or identify(base))(base, verify=False)
+		report.version = game_data.__class__.__name__
+		if check:
+			dangling.update({relation: len(rows) for relation, rows in game_data.check_integrity().items()})
+
+	def integrity():
+		after = {relation: len(rows) for relation, rows in game_data.check_integrity().items()}
+		report.dangling = {relation: (dangling.get(relation, 0), count) for relation, count in after.items() if count > dangling.get(relation, 0)}
+		if strict and report.dangling:
+			raise ValueError(f"New dangling references: {', '.join(f'{relation} {count - before}' for relation, (before, count) in report.dangling.items())}")
+
+	def save():
+		directory = os.path.dirname(output)
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+		temporary = output + '.tmp'
+		try:
+			game_data.save(temporary)
+			os.replace(temporary, output)
+		except BaseException:
+			if os.path.exists(temporary):
+				os.remove(temporary)
+			raise
+
+	if not step('load', load):
+		return report
+	for script in scripts:
+		if not step(_script_name(script), lambda: load_script(script)(game_data)):
+			return report
+	if check and not step('integrity', integrity):
+		return report
+	step('save', save)
+	return report
+
+
+def build(bases: list[str | PathLike[str]], scripts: list, output: str = DEFAULT_OUTPUT, jobs: int = None, check: bool = True, strict: bool = False, done: Callable[[BuildReport], None] = None) -> list[BuildReport]:
+	# scripts: see load_script, functions need to be importable by the worker processes
+	# check: report references that are dangling after the scripts but weren't before, strict: and don't write the file then
+	# done: called with every report as soon as its build is finished
+	# jobs: number of processes, 1 builds in this process
+	from tirganach.versions import identify
+	reports = [None] * len(bases)
+	builds = [] # (position, base, output path, version, seconds to identify it)
+	for position, base in enumerate(bases):
+		# a base that can't even be identified fails on its own, like any other step
+		start = time.perf_counter()
+		try:
+			game_data_class = identify(base)
+			path = output_path(base, output, game_data_class.__name__)
+		except Exception:
+			reports[position] = BuildReport(os.fspath(base), None)
+			reports[position].steps.append(BuildStep('identify', time.perf_counter() - start, traceback.format_exc()))
+			continue
+		builds.append((position, base, path, game_data_class, time.perf_counter() - start))
+	outputs = [path for position, base, path, game_data_class, seconds in builds]
+	duplicates = {path for path in outputs if outputs.count(path) > 1}
+	if duplicates:
+		raise ValueError(f"Several builds would be written to {sorted(duplicates)[0]}, use {{dir}} or {{version}} in the output")
+	for report in reports:
+		if report is not None and done:
+			done(report)
+
+	def finish(position: int, report: BuildReport, seconds: float):
+		report.steps.insert(0, BuildStep('identify', seconds))
+		reports[position] = report
+		if done:
+			done(report)
+
+	if jobs == 1 or len(builds) == 1:
+		for position, base, path, game_data_class, seconds in builds:
+			finish(position, build_file(base, scripts, path, check, strict, game_data_class), seconds)
+	elif builds:
+		with ProcessPoolExecutor(max_workers=jobs) as executor:
+			futures = {executor.submit(build_file, base, scripts, path, check, strict, game_data_class): (position, base, path, seconds) for position, base, path, game_data_class, seconds in builds}
+			for future in as_completed(futures):
+				position, base, path, seconds = futures[future]
+				try:
+					report = future.result()
+				except Exception:
+					# the worker itself died
+					report = BuildReport(os.fspath(base), path)
+					report.steps.append(BuildStep('worker', 0, traceback.format_exc()))
+				finish(position, report, seconds)
+	return reports
+
+
+def print_report(report: BuildReport):
+	print(f"{report.base} ({report.version or 'unknown version'}) -> {report.output or '-'}")
+	for step in report.steps:
+		if step.error:
+			print(f"  {step.name:<40} FAILED after {step.seconds:.2f}s")
+			print(''.join(f"    {line}\n" for line in step.error.rstrip().splitlines()), end='')
+		else:
+			print(f"  {step.name:<40} {step.seconds:.2f}s")
+	for relation, (before, after) in report.dangling.items():
+		print(f"  dangling {relation}: {before} -> {after}")
@@ -0,0 +1,71 @@
+import io
+import os
+from os import PathLike
+from typing import Type, get_args
+
+from tirganach.entities import Entity
+from tirganach.structure import GameData
+
+
+class CatalogEntry:
+	name: str
+	entity_type: Type[Entity]
+	offset: int # of the table body, like GameData._offsets
+	length: int # of the table body in bytes
+	rows: int | None # None if the length doesn't fit the entity definition
+	unknown1: bytes # header bytes 0-5
+	unknown2: bytes # header bytes 10-11
+
+	def __init__(self, name: str, entity_type: Type[Entity], offset: int, header: bytes):
+		self.name = name
+		self.entity_type = entity_type
+		self.offset = offset
+		self.length = int.from_bytes(header[6: 10], byteorder='little', signed=False)
+		row_length = entity_type._length()
+		self.rows = self.length // row_length if self.length % row_length == 0 else None
+		self.unknown1 = bytes(header[0: 6])
+		self.unknown2 = bytes(header[10: 12])
+
+	@property
+	def header_offset(self):
+		return self.offset - 12
+
+	def __repr__(self):
+		return f"<[CatalogEntry] {self.name} @ {hex(self.offset)}: {self.length} bytes, {self.rows} rows>"
+
+
+class Catalog(dict[str, CatalogEntry]):
+	header: bytes # the 20 bytes of general info at the start of the file
+	size: int
+
+	def __repr__(self):
+		return f"<[Catalog] {len(self)} tables, {self.size} bytes>"
+
+
+def catalog(source: bytes | str | PathLike[bytes], game_data_class: Type[GameData] = GameData) -> Catalog:
+	# only reads the file header and the table headers, seeking past the table bodies
+	if isinstance(source, PathLike) or isinstance(source, str):
+		fd = open(source, 'rb')
+	else:
+		fd = io.BytesIO(source)
+
+	result = Catalog()
+	with fd:
+		result.size = fd.seek(0, os.SEEK_END)
+		fd.seek(0)
+		result.header = fd.read(20)
+		offset = 20
+
+		for table_name, table_definition in game_data_class.table_info().items():
+			table_header = fd.read(12)
+			if len(table_header) < 12:
+				raise ValueError(f"File ends before the header of table {table_name} at {hex(offset)}")
+			offset += 12
+			entry = CatalogEntry(table_name, get_args(table_definition)[0], offset, table_header)
+			if offset + entry.length > result.size:
+				raise ValueError(f"Table {table_name} at {hex(offset)} claims {entry.length} bytes, but the file ends before that")
+			result[table_name] = entry
+			offset += entry.length
+			fd.seek(offset)
+
+	return result
@@ -17,17 +17,21 @@ def compare(gd1: GameData, gd2: GameData):
 		table1 = getattr(gd1, tablename)
 		table2 = getattr(gd2, tablename)
 
-		if table1._to_bytes() != table2._to_bytes():
-			center_print("", "", "")
-			center_print("", "", "", pad_center="_")
-			center_print("", tablename, "", pad_center="_", separator="|")
+		if table1.digest() == table2.digest():
+			continue
+
+		center_print("", "", "")
+		center_print("", "", "", pad_center="_")
+		center_print("", tablename, "", pad_center="_", separator="|")
 
 		for row_idx in range(max(len(table1), len(table2))):
 			row1 = table1[row_idx]
 			row2 = table2[row_idx]
 
-			if row1._to_bytes() != row2._to_bytes():
-				center_print("", f"{row1.name} ({row_idx})" if hasattr(row1, 'name') else row_idx, "", pad_center="_")
+			if row1._digest() == row2._digest():
+				continue
+
+			center_print("", f"{row1.name} ({row_idx})" if hasattr(row1, 'name') else row_idx, "", pad_center="_")
 
 			for attribute in row1._fields:
 				if getattr(row1, attribute) != getattr(row2, attribute):
@@ -1,3 +1,5 @@
+import hashlib
+
 from .types import School, Language, Race, Resource, SlotConfiguration, Gender, EquipmentSlot, ItemType, \
 	EquipmentType, RuneRace, RaceFlags, CultivationFlags
 from .fields import Field, IntegerField, StringField, BoolField, EnumField, SignedIntegerField, Relation, Alias
@@ -7,21 +9,45 @@ class Entity:
 	_fields: dict[str, Field]
 	_game_data = None
 	_custom_length: int = None
-	_primary: tuple[str] = None
+	_primary: tuple[str] = None # primary key fields, sorted alphabetically
+	_relations: dict[str, Relation]
 	_raw: bytes
+	_epoch: int = 0 # snapshot generation of the game data this row was last preserved at
+	_origin: 'Entity' = None # for rows forked into a snapshot: the shared row they stand in for
+	_dirty: bool = False # a field has been written since the row was read, so _raw might be outdated
 
 	def __init__(self, raw_bytes, game_data, **kwargs):
-		self._raw = raw_bytes or b'\x00' * self._length()
-		self._game_data = game_data
-		assert len(raw_bytes) == self._length()
+		# parsed values go straight into the dict, they are not edits
+		values = self.__dict__
+		values['_raw'] = raw_bytes = raw_bytes or b'\x00' * self._length()
+		values['_game_data'] = game_data
+		if game_data is not None and game_data._epoch:
+			values['_epoch'] = game_data._epoch
+		elif game_data is None:
+			# rows read by a table are checked by the table as a whole
+			self._validate()
 		#print("IN:", ' '.join(format(byte, '02x') for byte in raw_bytes))
 		for field_name, field_info in self._fields.items():
 			byte_source = raw_bytes[field_info.offset:field_info.offset+field_info.len_bytes]
-			val = field_info.parse_bytes(byte_source, parent_entity=self)
-			self.__setattr__(field_name, val)
+			values[field_name] = field_info.parse_bytes(byte_source, parent_entity=self)
 		for k, v in kwargs.items():
 			self.__setattr__(k, v)
 
+	def __setattr__(self, key, value):
+		if key in self._fields:
+			old = self.__dict__.get(key)
+			if old is value:
+				return
+			if self._game_data is not None:
+				self._game_data._before_write(self)
+			object.__setattr__(self, key, value)
+			self.__dict__['_dirty'] = True
+			self.__dict__.pop('_hash', None)
+			if self._game_data is not None:
+				self._game_data._after_write(self, key, old, value)
+		else:
+			object.__setattr__(self, key, value)
+
 	def __repr__(self):
 		if hasattr(self, 'name') and self.name:
 			return f"<[{self.__class__.__name__}] {self.name}>"
@@ -30,18 +56,53 @@ class Entity:
 
 
 	def _to_bytes(self):
+		if not self._dirty:
+			return bytes(self._raw)
 		result = bytearray(self._raw)
 		for field_name, field_info in self._fields.items():
 			source = self.__getattribute__(field_name)
 			val = field_info.dump_bytes(source)
 			result[field_info.offset:field_info.offset+field_info.len_bytes] = val
 		#print("OUT:", ' '.join(format(byte, '02x') for byte in result))
-		assert len(result) == self._length()
 		return bytes(result)
 
+	def _validate(self):
+		# per cell, see Validation.STRICT
+		if len(self._raw) != self._length():
+			raise ValueError(f"{self.__class__.__name__} needs {self._length()} bytes, got {len(self._raw)}")
+		for field_name, field_info in self._fields.items():
+			try:
+				field_info.check_bytes(self._raw[field_info.offset:field_info.offset+field_info.len_bytes])
+			except ValueError as e:
+				raise ValueError(f"{self.__class__.__name__}.{field_name}: {e}") from None
+
 	def _to_hex(self):
 		return ' '.join(format(byte, '02x') for byte in self._to_bytes())
 
+	def __reduce__(self):
+		# just the table name and bytes, the row is attached to the GameData bound in the receiving process (see GameData.bind)
+		from .structure import GameData
+		return _unpickle, (GameData.schema().table_names.get(self.__class__, self.__class__), self._to_bytes())
+
+	def __copy__(self):
+		# copies stay attached to our GameData, only pickling detaches a row
+		return self.clone()
+
+	def __deepcopy__(self, memo):
+		# field values are immutable, nothing to go deeper into
+		return self.clone()
+
+	def _digest(self) -> bytes:
+		# content hash, cached until the next write
+		digest = self.__dict__.get('_hash')
+		if digest is None:
+			digest = self.__dict__['_hash'] = hashlib.md5(self._to_bytes()).digest()
+		return digest
+
+	def _changed(self) -> bool:
+		# compared to the bytes it was read from
+		return self._dirty and self._to_bytes() != self._raw
+
 	@classmethod
 	def _length(cls):
 		return cls._custom_length or max(f.offset+f.len_bytes for f in cls._fields.values())
@@ -55,6 +116,9 @@ class Entity:
 				cls._fields[field_name].data_type = field_type
 				field_info = cls._fields[field_name]
 
+		cls._primary = tuple(sorted(field_name for field_name, field in cls._fields.items() if field.primary))
+		cls._relations = {name: attr for name, attr in cls.__dict__.items() if isinstance(attr, Relation)}
+
 		# make sure our definitions dont overlap
 		bytes_accounted = set()
 		for field_info in cls._fields.values():
@@ -63,11 +127,39 @@ class Entity:
 				bytes_accounted.add(b)
 
 	def set(self, **kwargs):
-		for k, v in kwargs.items():
-			setattr(self, k, v)
+		if self._game_data is None or self._game_data._read_only:
+			# nothing to undo, a read-only GameData refuses the first write like any other
+			for k, v in kwargs.items():
+				setattr(self, k, v)
+			return
+		# one step to undo
+		with self._game_data.transaction():
+			for k, v in kwargs.items():
+				setattr(self, k, v)
 
 	def clone(self):
-		return self.__class__(self._to_bytes(), game_data=self._game_data)
+		clone = self._fork(self._game_data)
+		clone.__dict__['_origin'] = None
+		clone.__dict__['_epoch'] = self._game_data._epoch if self._game_data is not None else 0
+		return clone
+
+	def _fork(self, game_data, origin: 'Entity' = None):
+		# shallow copy, field values are immutable so there is no need to go through the bytes again
+		# the fork still stands in for a row that older snapshots might share, so it starts out unpreserved
+		# origin: what stands for the row in the table of the fork
+		fork = object.__new__(self.__class__)
+		fork.__dict__.update(self.__dict__)
+		fork.__dict__['_game_data'] = game_data
+		fork.__dict__['_epoch'] = 0
+		fork.__dict__['_origin'] = origin or self._origin or self
+		return fork
+
+
+def _unpickle(table_name: str | type, raw: bytes) -> Entity:
+	from .structure import GameData
+	game_data = GameData._bound
+	entity_type = (game_data or GameData).schema().entity_types[table_name] if isinstance(table_name, str) else table_name
+	return entity_type(raw, game_data=game_data)
 
 
 # credit to
@@ -202,7 +294,7 @@ class Quest(Entity):
 	# todo these dont seem to work
 
 	parent_quest: 'Quest' = Relation('quests', {'quest_id': 'parent_quest_id'})
-	sub_quests: 'list[Quest]' = Relation('quests', {'parent_quest_id': 'quest_id'}, multiple=True)
+	sub_quests: 'list[Quest]' = Relation('quests', {'parent_quest_id': 'quest_id'}, multiple=True, owned=True)
 
 
 class RaceDB(Entity):
@@ -366,7 +458,7 @@ class Spell(Entity):
 	#name: str = Relation('localisation', {'text_id': 'name_id', 'language': Language.ENGLISH}, attributes=['text'])
 	name: str = Relation('spell_names', {'spell_name_id': 'spell_name_id'}, attributes=['name'])
 	level: int = Alias('req1_level')
-	effects: list[int] = Relation('spell_effects', {'spell_item_id': 'spell_id'}, attributes=['effect_id'], multiple=True)
+	effects: list[int] = Relation('spell_effects', {'spell_item_id': 'spell_id'}, attributes=['effect_id'], multiple=True, owned=True)
 
 
 class CreatureSpell(Entity):
@@ -435,9 +527,9 @@ class CreatureStats(Entity):
 	head_id: int = IntegerField(44, 2)
 	equipment_slots: SlotConfiguration = EnumField(46, 1)
 
-	skills: list[CreatureSkill] = Relation('creature_skills', {'stats_id': 'stats_id'}, multiple=True)
+	skills: list[CreatureSkill] = Relation('creature_skills', {'stats_id': 'stats_id'}, multiple=True, owned=True)
 	spells: list[CreatureSpell] = Relation('creature_spells', {'creature_id': 'stats_id'}, multiple=True)
-	hero_spells: list[HeroSpell] = Relation('hero_spells', {'stats_id': 'stats_id'}, multiple=True)
+	hero_spells: list[HeroSpell] = Relation('hero_spells', {'stats_id': 'stats_id'}, multiple=True, owned=True)
 	# todo are these connected to stats or creature?
 
 
@@ -521,7 +613,7 @@ class Building(Entity):
 
 	name: str = Relation('localisation', {'text_id': 'name_id', 'language': Language.ENGLISH}, attributes=['text'])
 	description: str = Relation('localisation', {'text_id': 'description_id', 'language': Language.ENGLISH}, attributes=['text'])
-	requirements: list[BuildingRequirement] = Relation('building_requirements', {'building_id': 'building_id'}, multiple=True)
+	requirements: list[BuildingRequirement] = Relation('building_requirements', {'building_id': 'building_id'}, multiple=True, owned=True)
 
 	def info(self):
 		return {
@@ -563,8 +655,14 @@ class Item(Entity):
 	army_unit: 'Creature' = Relation('creatures', {'creature_id': 'army_unit_id'})
 	building: Building = Relation('buildings', {'building_id': 'building_id'})
 	name: str = Relation('localisation', {'text_id': 'name_id', 'language': Language.ENGLISH}, attributes=['text'])
-	inventory_match: 'Item' = Relation('item_installs', {'installed_item_id': 'item_id'}, attributes=['inventory_item'])
-	installed_match: 'Item' = Relation('item_installs', {'inventory_item_id': 'item_id'}, attributes=['installed_item'])
+	inventory_match: 'Item' = Relation('item_installs', {'installed_item_id': 'item_id'}, attributes=['inventory_item'], owned=True)
+	installed_match: 'Item' = Relation('item_installs', {'inventory_item_id': 'item_id'}, attributes=['installed_item'], owned=True)
+	armor: 'Armor' = Relation('armor', {'item_id': 'item_id'}, owned=True)
+	weapon: 'Weapon' = Relation('weapons', {'item_id': 'item_id'}, owned=True)
+	requirements: list[ItemRequirement] = Relation('item_requirements', {'item_id': 'item_id'}, multiple=True, owned=True)
+	effects: list[int] = Relation('item_effects', {'item_id': 'item_id'}, attributes=['effect_id'], multiple=True, owned=True)
+	ui: list[ItemUI] = Relation('item_ui', {'item_id': 'item_id'}, multiple=True, owned=True)
+	item_set: ItemSet = Relation('item_sets', {'set_id': 'item_set_id'})
 
 	def info(self):
 		return {
@@ -659,11 +757,11 @@ class Creature(Entity):
 
 	name: str = Relation('localisation', {'text_id': 'name_id', 'language': Language.ENGLISH}, attributes=['text'])
 	stats: CreatureStats = Relation('creature_stats', {'stats_id': 'stats_id'})
-	requirements: list[CreatureResourceRequirement] = Relation('creature_resources', {'creature_id': 'creature_id'}, multiple=True)
-	equipment: list[CreatureEquipment] = Relation('creature_equipment', {'creature_id': 'creature_id'}, multiple=True)
+	requirements: list[CreatureResourceRequirement] = Relation('creature_resources', {'creature_id': 'creature_id'}, multiple=True, owned=True)
+	equipment: list[CreatureEquipment] = Relation('creature_equipment', {'creature_id': 'creature_id'}, multiple=True, owned=True)
 
 	skills: list[CreatureSkill] = Relation('creature_skills', {'stats_id': 'creature_id'}, multiple=True)
-	spells: list[CreatureSpell] = Relation('creature_spells', {'creature_id': 'creature_id'}, multiple=True)
+	spells: list[CreatureSpell] = Relation('creature_spells', {'creature_id': 'creature_id'}, multiple=True, owned=True)
 	# todo are these connected to stats or creature?
 
 	# todo how do we match the description? e.g. elf healer is creature 547 (23 02), has advanced description 386 (82 01)
@@ -701,7 +799,7 @@ class CreatureDrop(Entity):
 	item1: Item = Relation('items', {'item_id': 'item1_id'})
 	item2: Item = Relation('items', {'item_id': 'item2_id'})
 	item3: Item = Relation('items', {'item_id': 'item3_id'})
-	creature: Creature = Relation('creature', {'creature_id': 'creature_id'})
+	creature: Creature = Relation('creatures', {'creature_id': 'creature_id'})
 
 
 class MerchantPriceMultiplier(Entity):
@@ -734,8 +832,8 @@ class MerchantInventory(Entity):
 	creature_id: int = IntegerField(2, 2)
 
 	merchant: Creature = Relation('creatures', {'creature_id': 'creature_id'})
-	items: list[Item] = Relation('merchant_inventory_items', {'merchant_inventory_id': 'merchant_inventory_id'}, multiple=True)
-	price_multipliers: list[MerchantPriceMultiplier] = Relation('merchant_price_multipliers', {'merchant_inventory_id': 'merchant_inventory_id'}, multiple=True)
+	items: list[Item] = Relation('merchant_inventory_items', {'merchant_inventory_id': 'merchant_inventory_id'}, multiple=True, owned=True)
+	price_multipliers: list[MerchantPriceMultiplier] = Relation('merchant_price_multipliers', {'merchant_inventory_id': 'merchant_inventory_id'}, multiple=True, owned=True)
 
 
 class ObjectLoot(Entity):
@@ -772,7 +870,7 @@ class Object(Entity): # most descriptive naming
 	height: int = IntegerField(51, 2)
 
 	name: str = Relation('localisation', {'text_id': 'name_id', 'language': Language.ENGLISH}, attributes=['text'])
-	loot: list[ObjectLoot] = Relation('object_loot', {'object_id': 'object_id'}, multiple=True)
+	loot: list[ObjectLoot] = Relation('object_loot', {'object_id': 'object_id'}, multiple=True, owned=True)
 
 
 class Terrain(Entity):
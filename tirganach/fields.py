@@ -3,6 +3,7 @@ import types
 from enum import Enum
 from typing import Type, Callable
 
+from tirganach.indexes import RelationView
 from tirganach.types import UnknownEnumMember
 
 debug_missing_enum_members = {}
@@ -37,6 +38,23 @@ class Field:
 	def dump_bytes(self, source):
 		raise NotImplemented()
 
+	def prepare_column(self, values: list) -> list:
+		# checks (and if needed converts) many values at once, so that a bulk write either fits as a whole or not at all
+		return values
+
+	def check_column(self, body: bytes, row_length: int):
+		# checks the bytes of this field in all rows of a table body at once, raises ValueError
+		pass
+
+	def check_bytes(self, byte_source: bytes):
+		# same for a single cell, only used in strict validation
+		if len(byte_source) != self.len_bytes:
+			raise ValueError(f"Expected {self.len_bytes} bytes, got {len(byte_source)}")
+
+	def _column(self, body: bytes, row_length: int) -> bytes:
+		# all bytes of this field, byte by byte position rather than row by row
+		return b''.join(body[self.offset+i::row_length] for i in range(self.len_bytes))
+
 
 class ByteField(Field):
 	data_type = bytes
@@ -53,12 +71,28 @@ class IntegerField(Field):
 	signed: bool = False
 
 	def parse_bytes(self, byte_source: bytes, parent_entity=None):
-		assert len(byte_source) == self.len_bytes
 		return int.from_bytes(byte_source, byteorder='little', signed=self.signed)
 
 	def dump_bytes(self, source: int):
 		return source.to_bytes(self.len_bytes, byteorder='little', signed=self.signed)
 
+	def value_range(self) -> tuple[int, int]:
+		if self.signed:
+			return -(1 << (8 * self.len_bytes - 1)), (1 << (8 * self.len_bytes - 1)) - 1
+		return 0, (1 << (8 * self.len_bytes)) - 1
+
+	def prepare_column(self, values: list) -> list:
+		values = [round(v) if isinstance(v, float) else v for v in values]
+		wrong_type = [v for v in values if not isinstance(v, int)]
+		if wrong_type:
+			raise TypeError(f"Expected integers, got {wrong_type[0]!r}")
+		if values:
+			lowest, highest = self.value_range()
+			out_of_range = [v for v in values if not lowest <= v <= highest]
+			if out_of_range:
+				raise OverflowError(f"{len(out_of_range)} values out of range {lowest}..{highest}, e.g. {out_of_range[0]}")
+		return values
+
 
 class SignedIntegerField(IntegerField):
 	signed = True
@@ -68,32 +102,64 @@ class StringField(Field):
 	data_type = str
 
 	def parse_bytes(self, byte_source: bytes, parent_entity=None):
-		assert len(byte_source) == self.len_bytes
-		return byte_source.rstrip(b'\x00').decode('windows-1252')
+		# everything but the padding is decoded anyway, so this is where a table checks its strings (no check_column)
+		try:
+			return byte_source.rstrip(b'\x00').decode('windows-1252')
+		except UnicodeDecodeError as e:
+			raise ValueError(f"Byte {e.object[e.start]:#04x} is not valid windows-1252") from None
 
 	def dump_bytes(self, source: str):
 		result = source.encode('windows-1252').ljust(self.len_bytes, b'\x00')
 		assert len(result) == self.len_bytes
 		return result
 
+	def prepare_column(self, values: list) -> list:
+		for value in values:
+			if not isinstance(value, str):
+				raise TypeError(f"Expected strings, got {value!r}")
+			try:
+				encoded = value.encode('windows-1252')
+			except UnicodeEncodeError as e:
+				raise ValueError(f"Can't be written as windows-1252: {e.object[e.start]!r} in {value[:32]!r}") from None
+			if len(encoded) > self.len_bytes:
+				raise ValueError(f"Longer than {self.len_bytes} bytes: {value[:32]!r}...")
+		return values
+
+	def check_bytes(self, byte_source: bytes):
+		super().check_bytes(byte_source)
+		try:
+			byte_source.decode('windows-1252')
+		except UnicodeDecodeError as e:
+			raise ValueError(f"Byte {e.object[e.start]:#04x} is not valid windows-1252") from None
+
 
 class BoolField(Field):
 	data_type = bool
 
 	def parse_bytes(self, byte_source: bytes, parent_entity=None):
-		assert len(byte_source) == 1 == self.len_bytes
-		assert byte_source[0] in (0, 1)
 		return byte_source[0] != 0
 
 	def dump_bytes(self, source: bool):
 		return b'\x01' if source else b'\x00'
 
+	def prepare_column(self, values: list) -> list:
+		return [bool(v) for v in values]
+
+	def check_column(self, body: bytes, row_length: int):
+		invalid = self._column(body, row_length).translate(None, b'\x00\x01')
+		if invalid:
+			raise ValueError(f"{len(invalid)} values that aren't 0 or 1, e.g. {invalid[0]}")
+
+	def check_bytes(self, byte_source: bytes):
+		super().check_bytes(byte_source)
+		if byte_source[0] not in (0, 1):
+			raise ValueError(f"Expected 0 or 1, got {byte_source[0]}")
+
 
 class EnumField(Field):
 	data_type: Type[Enum]
 
 	def parse_bytes(self, byte_source: bytes, parent_entity=None):
-		assert len(byte_source) == self.len_bytes
 		int_values = tuple(byte for byte in byte_source)
 
 		if isinstance(self.data_type, types.UnionType):
@@ -129,23 +195,48 @@ class EnumField(Field):
 class Relation:
 	mapping: dict
 	fallback_mapping: dict
-	target_table: str
+	table_name: str
 	multiple: bool
+	owned: bool # the rows it finds belong to this one, a cascading delete takes them along
 	attributes: list
 	sort: Callable
 
+	# filled in when the schema of a GameData class is compiled
+	owner: type = None
+	name: str = None
+	target_type: type = None
+	_lookups: list = None # per mapping: (target fields, source attributes or constants, whether that's the primary key)
+
 	# todo: assign object directly to relation -> sets reference id
 
-	def __init__(self, table_name: str, mapping: dict, fallback_mapping: dict = None, multiple=False, sort=None, attributes=None):
+	def __init__(self, table_name: str, mapping: dict, fallback_mapping: dict = None, multiple=False, sort=None, attributes=None, owned=False):
 		self.table_name = table_name
 		self.mapping = mapping
 		self.fallback_mapping = fallback_mapping or {}
 		self.multiple = multiple
+		self.owned = owned
 		self.attributes = attributes or []
 		self.sort = sort
 
+	def __set_name__(self, owner, name):
+		self.owner = owner
+		self.name = name
+
+	def _compile(self, target_type):
+		self.target_type = target_type
+		lookups = []
+		for mapping in (self.mapping, self.fallback_mapping):
+			if not mapping:
+				continue
+			indexed = bool(target_type._primary) and set(mapping) == set(target_type._primary)
+			keys = target_type._primary if indexed else tuple(mapping)
+			lookups.append((keys, tuple(mapping[k] for k in keys), indexed))
+		self._lookups = lookups
+
 	def __get__(self, instance, owner):
 		if not instance: return None
+		if self.multiple:
+			return self._get_grouped(instance)
 
 		result = self._get_proxied(instance)
 		if self.sort and len(result) > 1:
@@ -178,17 +269,29 @@ class Relation:
 
 		gd = instance._game_data
 		table = getattr(gd, self.table_name)
-		for mapping in (self.mapping, self.fallback_mapping):
-			instanced_mapping = {}
-			for k, v in mapping.items():
-				if isinstance(v, str):
-					instanced_mapping[k] = getattr(instance, v)
-				else:
-					instanced_mapping[k] = v
-			result = table.where(**instanced_mapping)
+		if self._lookups is None:
+			gd.schema()
+		for keys, sources, indexed in self._lookups:
+			values = tuple(getattr(instance, v) if isinstance(v, str) else v for v in sources)
+			if indexed:
+				result = table._lookup(values)
+			else:
+				result = table.where(**dict(zip(keys, values)))
 			if result: return result
 		return []
 
+	def _get_grouped(self, instance):
+		# multiple rows, from the group index of the target table instead of scanning and sorting it every time
+		gd = instance._game_data
+		table = getattr(gd, self.table_name)
+		if self._lookups is None:
+			gd.schema()
+		for keys, sources, indexed in self._lookups:
+			values = tuple(getattr(instance, v) if isinstance(v, str) else v for v in sources)
+			slots = table._grouped(self, keys, values)
+			if slots: return RelationView(table, slots, self.attributes)
+		return None
+
 
 class Alias:
 	target: str
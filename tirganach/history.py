@@ -0,0 +1,121 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+	from .entities import Entity
+	from .structure import Table
+
+
+# one entry per edit, only old and new state - enough to walk back and forth without touching any other rows
+
+class FieldChange:
+	__slots__ = ('row', 'field', 'old', 'new')
+
+	def __init__(self, row: 'Entity', field: str, old, new):
+		self.row = row
+		self.field = field
+		self.old = old
+		self.new = new
+
+	def undo(self):
+		setattr(self.row, self.field, self.old)
+
+	def redo(self):
+		setattr(self.row, self.field, self.new)
+
+
+class RowInsert:
+	__slots__ = ('table', 'index', 'row')
+
+	def __init__(self, table: 'Table', index: int, row: 'Entity'):
+		self.table = table
+		self.index = index
+		self.row = row
+
+	def undo(self):
+		self.table._delete_rows(self.table._locate(self.row, self.index), 1)
+
+	def redo(self):
+		self.table._insert_rows(self.index, [self.row])
+
+
+class RowDelete(RowInsert):
+	__slots__ = ()
+
+	def undo(self):
+		RowInsert.redo(self)
+
+	def redo(self):
+		RowInsert.undo(self)
+
+
+class ChangeLog:
+	undo_stack: list[list]
+	redo_stack: list[list]
+	replaying: bool
+
+	def __init__(self):
+		self.undo_stack = []
+		self.redo_stack = []
+		self.replaying = False
+		self._open = [] # change groups of the currently open (nested) transactions
+
+	def record(self, change):
+		if self.replaying:
+			return
+		if self._open:
+			self._open[-1].append(change)
+		else:
+			self.undo_stack.append([change])
+			self.redo_stack.clear()
+
+	def begin(self):
+		self._open.append([])
+
+	def commit(self):
+		group = self._open.pop()
+		if not group:
+			return
+		if self._open:
+			self._open[-1].extend(group)
+		else:
+			self.undo_stack.append(group)
+			self.redo_stack.clear()
+
+	def rollback(self):
+		self._replay(self._open.pop(), undo=True)
+
+	def undo(self) -> bool:
+		if self._open:
+			raise RuntimeError("Cannot undo inside of a transaction")
+		if not self.undo_stack:
+			return False
+		group = self.undo_stack.pop()
+		self._replay(group, undo=True)
+		self.redo_stack.append(group)
+		return True
+
+	def redo(self) -> bool:
+		if self._open:
+			raise RuntimeError("Cannot redo inside of a transaction")
+		if not self.redo_stack:
+			return False
+		group = self.redo_stack.pop()
+		self._replay(group, undo=False)
+		self.undo_stack.append(group)
+		return True
+
+	def clear(self):
+		self.undo_stack.clear()
+		self.redo_stack.clear()
+
+	def _replay(self, group: list, undo: bool):
+		self.replaying = True
+		try:
+			if undo:
+				for change in reversed(group):
+					change.undo()
+			else:
+				for change in group:
+					change.redo()
+		finally:
+			self.replaying = False
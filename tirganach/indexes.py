@@ -0,0 +1,222 @@
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from operator import itemgetter
+from typing import Callable
+
+
+# secondary indexes of a table, kept up to date by the table on every insert, delete and field write
+# like Table.entity_index they hold the slots of the table (the shared rows on snapshots), keys are read through peek
+
+class RangeIndex:
+	field: str
+	keys: list # sorted
+	slots: list # in the same order as the keys
+
+	def __init__(self, field: str, slots: list = (), peek: Callable = None):
+		self.field = field
+		entries = sorted(((getattr(peek(slot) if peek else slot, field), slot) for slot in slots), key=itemgetter(0))
+		self.keys = [key for key, slot in entries]
+		self.slots = [slot for key, slot in entries]
+
+	def __repr__(self):
+		return f"<[RangeIndex] {self.field}: {len(self.keys)} rows>"
+
+	def __len__(self):
+		return len(self.keys)
+
+	def copy(self) -> 'RangeIndex':
+		index = RangeIndex(self.field)
+		index.keys = list(self.keys)
+		index.slots = list(self.slots)
+		return index
+
+	def add(self, slot, key):
+		# after all rows with the same key
+		pos = bisect_right(self.keys, key)
+		self.keys.insert(pos, key)
+		self.slots.insert(pos, slot)
+
+	def remove(self, slot, key) -> bool:
+		for pos in range(bisect_left(self.keys, key), bisect_right(self.keys, key)):
+			if self.slots[pos] is slot:
+				del self.keys[pos]
+				del self.slots[pos]
+				return True
+		return False
+
+	def move(self, slot, old, new):
+		# only rows that are actually indexed, written rows might not be in the table (yet)
+		if self.remove(slot, old):
+			self.add(slot, new)
+
+	def span(self, low=None, high=None, include_low: bool = True, include_high: bool = True) -> range:
+		# positions of all keys between low and high, None for open ends
+		if low is None:
+			start = 0
+		else:
+			start = (bisect_left if include_low else bisect_right)(self.keys, low)
+		if high is None:
+			stop = len(self.keys)
+		else:
+			stop = (bisect_right if include_high else bisect_left)(self.keys, high)
+		return range(start, max(start, stop))
+
+
+class GroupIndex:
+	# rows of a table grouped by the fields a multiple=True relation looks them up by, in table order
+	keys: tuple
+	groups: dict[tuple, list]
+	stale: bool # rows were inserted, removed, reordered or regrouped since building, rebuilt on next use
+	_sorted: dict # relation -> key -> slots in the order of relation.sort
+
+	def __init__(self, keys: tuple, slots, peek: Callable):
+		self.keys = keys
+		self.groups = {}
+		self.stale = False
+		self._sorted = {}
+		for slot in slots:
+			row = peek(slot)
+			self.groups.setdefault(tuple(getattr(row, key) for key in keys), []).append(slot)
+
+	def __repr__(self):
+		return f"<[GroupIndex] {', '.join(self.keys)}: {len(self.groups)} groups>"
+
+	def get(self, relation, key: tuple, peek: Callable) -> list:
+		slots = self.groups.get(key)
+		if not slots or relation.sort is None or len(slots) < 2:
+			return slots
+		cache = self._sorted.setdefault(relation, {})
+		result = cache.get(key)
+		if result is None:
+			result = cache[key] = sorted(slots, key=lambda slot: relation.sort(peek(slot)))
+		return result
+
+	def changed(self, field: str):
+		if field in self.keys:
+			self.stale = True
+		else:
+			self._sorted.clear()
+
+
+class RelationView(Sequence):
+	# read-only result of a multiple=True relation, rows (or their attributes) are only resolved when accessed
+	# the slot lists are never changed in place by the index, so a view keeps showing the rows it was created with
+	__slots__ = ('_table', '_slots', '_attributes')
+
+	def __init__(self, table, slots: list, attributes: list):
+		self._table = table
+		self._slots = slots
+		self._attributes = attributes
+
+	def _resolve(self, slot):
+		value = self._table._own(slot)
+		for key in self._attributes:
+			value = getattr(value, key)
+		return value
+
+	def __getitem__(self, item):
+		if isinstance(item, slice):
+			return [self._resolve(slot) for slot in self._slots[item]]
+		return self._resolve(self._slots[item])
+
+	def __len__(self):
+		return len(self._slots)
+
+	def __iter__(self):
+		for slot in self._slots:
+			yield self._resolve(slot)
+
+	def __eq__(self, other):
+		if isinstance(other, (list, tuple, RelationView)):
+			return list(self) == list(other)
+		return NotImplemented
+
+	__hash__ = None
+
+	def __repr__(self):
+		return repr(list(self))
+
+
+class ReferenceIndex:
+	# rows of a table by the values of the fields they reference other rows with, see GameData.referrers
+	fields: tuple
+	rows: dict[tuple, dict] # values -> slots (as keys, so that removing is cheap and order is kept)
+
+	def __init__(self, fields: tuple, slots, peek: Callable):
+		self.fields = fields
+		self.rows = {}
+		for slot in slots:
+			self.add(slot, peek(slot))
+
+	def __repr__(self):
+		return f"<[ReferenceIndex] {', '.join(self.fields)}: {len(self.rows)} keys>"
+
+	def _key(self, row, **override) -> tuple:
+		return tuple(override[field] if field in override else getattr(row, field) for field in self.fields)
+
+	def add(self, slot, row):
+		self.rows.setdefault(self._key(row), {})[slot] = None
+
+	def remove(self, slot, row, **override) -> bool:
+		key = self._key(row, **override)
+		slots = self.rows.get(key)
+		if slots is None or slot not in slots:
+			return False
+		del slots[slot]
+		if not slots:
+			del self.rows[key]
+		return True
+
+	def move(self, slot, row, field: str, old):
+		# only rows that are actually indexed, written rows might not be in the table (yet)
+		if self.remove(slot, row, **{field: old}):
+			self.add(slot, row)
+
+	def get(self, key: tuple) -> list:
+		return list(self.rows.get(key, ()))
+
+
+class IdAllocator:
+	# free values of an integer key field, lowest first, see Table.new
+	# 0 is never handed out, references use it for "none"
+	# neither are values of deleted rows (Table passes the rows deleted since loading along): rows that referenced the
+	# deleted row (or belonged to it, after a delete without cascade) would silently belong to the new one
+	field: str
+	used: dict[int, int] # value -> number of rows holding it
+	highest: int
+	_next: int # nothing below this is handed out
+
+	def __init__(self, field: str, slots, peek: Callable, highest: int):
+		self.field = field
+		self.used = {}
+		self.highest = highest
+		self._next = 1
+		for slot in slots:
+			self.add(getattr(peek(slot), field))
+
+	def __repr__(self):
+		return f"<[IdAllocator] {self.field}: {len(self.used)} used>"
+
+	def add(self, value: int):
+		self.used[value] = self.used.get(value, 0) + 1
+
+	def remove(self, value: int):
+		count = self.used.get(value, 0)
+		if count > 1:
+			self.used[value] = count - 1
+		elif count:
+			del self.used[value]
+
+	def move(self, old: int, new: int):
+		self.remove(old)
+		self.add(new)
+
+	def take(self) -> int:
+		# reserved until it's freed again, so that a batch can take several before adding its rows
+		value = self._next
+		while value in self.used:
+			value += 1
+		if value > self.highest:
+			raise OverflowError(f"No free {self.field} left")
+		self._next = value + 1
+		return value
@@ -0,0 +1,238 @@
+import io
+from difflib import SequenceMatcher
+from os import PathLike
+from typing import Type
+
+from tirganach.catalog import catalog
+from tirganach.entities import Entity
+from tirganach.structure import GameData
+
+
+# three-way merge of files that were derived from the same base, table by table, row by row and field by field
+# rows are matched by primary key (the nth row with a key to the nth one, should a table have duplicates),
+# rows of tables without one by a diff of each side against base, so rows inserted or deleted on one side don't shift
+# the others - changed rows are paired up by position within the stretch that changed, rows inserted at the same
+# place on both sides are kept from both
+# everything is compared as bytes, fields are only decoded to report conflicts, which are resolved in favor of ours
+
+
+class Conflict:
+	table: str
+	key: tuple | int | None # primary key values, or the position of the row in base (None for the file header)
+	field: str | None # None if the whole row is in conflict: one side deleted it and the other changed it, or both added it differently
+	base: object
+	ours: object
+	theirs: object
+
+	def __init__(self, table: str, key, field: str | None, base, ours, theirs):
+		self.table = table
+		self.key = key
+		self.field = field
+		self.base = base
+		self.ours = ours
+		self.theirs = theirs
+
+	def __repr__(self):
+		return f"<[Conflict] {self.table} {self.key} {self.field or 'row'}: {self.base!r} -> {self.ours!r} / {self.theirs!r}>"
+
+
+class MergeResult:
+	data: bytes
+	conflicts: list[Conflict]
+	tables: dict[str, str] # table name -> 'base', 'ours', 'theirs' (taken as a whole) or 'rows' (merged row by row)
+
+	def __init__(self, data: bytes, conflicts: list[Conflict], tables: dict[str, str]):
+		self.data = data
+		self.conflicts = conflicts
+		self.tables = tables
+
+	def __repr__(self):
+		merged = sum(1 for how in self.tables.values() if how == 'rows')
+		return f"<[MergeResult] {merged} tables merged, {len(self.conflicts)} conflicts>"
+
+	def game_data(self, game_data_class: Type[GameData] = GameData) -> GameData:
+		return game_data_class(self.data, verify=False)
+
+	def save(self, filename):
+		with io.open(filename, 'wb') as fd:
+			fd.write(self.data)
+
+
+def _read(source: bytes | str | PathLike[bytes] | GameData) -> bytes:
+	if isinstance(source, GameData):
+		return source._to_bytes()
+	if isinstance(source, PathLike) or isinstance(source, str):
+		with io.open(source, 'rb') as fd:
+			return fd.read()
+	return bytes(source)
+
+
+def _pick(base, ours, theirs) -> tuple[object, bool]:
+	# the side that changed something, and whether both did (differently)
+	if ours == theirs or theirs == base:
+		return ours, False
+	if ours == base:
+		return theirs, False
+	return ours, True
+
+
+def merge(base: bytes | str | PathLike[bytes] | GameData, ours: bytes | str | PathLike[bytes] | GameData, theirs: bytes | str | PathLike[bytes] | GameData, game_data_class: Type[GameData] = GameData) -> MergeResult:
+	files = [_read(source) for source in (base, ours, theirs)]
+	entries = [catalog(raw, game_data_class) for raw in files]
+	conflicts = []
+	tables = {}
+
+	header, conflict = _pick(*(raw[:20] for raw in files))
+	if conflict:
+		conflicts.append(Conflict('header', None, None, *(raw[:20] for raw in files)))
+	result = bytearray(header)
+
+	for table_name, entity_type in game_data_class.schema().entity_types.items():
+		sides = [catalog_entries[table_name] for catalog_entries in entries]
+		bodies = [raw[entry.offset: entry.offset+entry.length] for raw, entry in zip(files, sides)]
+		headers = [raw[entry.header_offset: entry.offset] for raw, entry in zip(files, sides)]
+
+		base_body, our_body, their_body = bodies
+		if our_body == their_body == base_body:
+			body, how = our_body, 'base'
+		elif our_body == their_body or their_body == base_body:
+			body, how = our_body, 'ours'
+		elif our_body == base_body:
+			body, how = their_body, 'theirs'
+		else:
+			for entry in sides:
+				if entry.rows is None:
+					raise ValueError(f"Table {table_name}: {entry.length} bytes is not a multiple of the row length {entity_type._length()}")
+			body, how = _merge_table(table_name, entity_type, *bodies, conflicts), 'rows'
+		tables[table_name] = how
+
+		# the unknown header bytes like any other, the length is ours to set
+		table_header, conflict = _pick(*(header[:6] + header[10:] for header in headers))
+		if conflict:
+			conflicts.append(Conflict(table_name, None, None, *headers))
+		result += table_header[:6] + len(body).to_bytes(length=4, byteorder='little', signed=False) + table_header[6:]
+		result += body
+
+	return MergeResult(bytes(result), conflicts, tables)
+
+
+def _merge_table(table_name: str, entity_type: Type[Entity], base: bytes, ours: bytes, theirs: bytes, conflicts: list[Conflict]) -> bytes:
+	row_length = entity_type._length()
+	base_rows, our_rows, their_rows = ([body[i: i+row_length] for i in range(0, len(body), row_length)] for body in (base, ours, theirs))
+	merger = _RowMerger(table_name, entity_type, conflicts)
+	merged = []
+
+	if entity_type._primary:
+		base_rows, our_rows, their_rows = (merger.keyed(rows) for rows in (base_rows, our_rows, their_rows))
+		# ours first, in our order, then whatever only theirs has
+		for key in list(our_rows) + [key for key in their_rows if key not in our_rows]:
+			merged.append(merger.row(key, base_rows.get(key), our_rows.get(key), their_rows.get(key)))
+	else:
+		our_matches, our_insertions = _align(base_rows, our_rows)
+		their_matches, their_insertions = _align(base_rows, their_rows)
+
+		def inserted(anchor: int) -> list[bytes]:
+			added = our_insertions.get(anchor, [])
+			known = set(added)
+			return added + [row for row in their_insertions.get(anchor, []) if row not in known]
+
+		merged += inserted(-1)
+		for idx, base_row in enumerate(base_rows):
+			our_idx = our_matches.get(idx)
+			their_idx = their_matches.get(idx)
+			our_row = our_rows[our_idx] if our_idx is not None else None
+			their_row = their_rows[their_idx] if their_idx is not None else None
+			merged.append(merger.row(idx, base_row, our_row, their_row))
+			merged += inserted(idx)
+
+	return b''.join(row for row in merged if row is not None)
+
+
+def _align(base_rows: list[bytes], rows: list[bytes]) -> tuple[dict[int, int], dict[int, list[bytes]]]:
+	# base index -> index of the same (or changed) row on this side, and the rows it inserted after a base index (-1: first)
+	matches = {}
+	start = 0
+	while start < min(len(base_rows), len(rows)) and base_rows[start] == rows[start]:
+		matches[start] = start
+		start += 1
+	base_end, end = len(base_rows), len(rows)
+	while base_end > start and end > start and base_rows[base_end-1] == rows[end-1]:
+		base_end -= 1
+		end -= 1
+		matches[base_end] = end
+	# only the part in between needs an actual diff
+	matcher = SequenceMatcher(None, base_rows[start:base_end], rows[start:end], autojunk=False)
+	for tag, base_from, base_to, side_from, side_to in matcher.get_opcodes():
+		if tag in ('equal', 'replace'):
+			for offset in range(min(base_to - base_from, side_to - side_from)):
+				matches[start + base_from + offset] = start + side_from + offset
+
+	matched = {idx: base_idx for base_idx, idx in matches.items()}
+	insertions = {}
+	anchor = -1
+	for idx, row in enumerate(rows):
+		if idx in matched:
+			anchor = matched[idx]
+		else:
+			insertions.setdefault(anchor, []).append(row)
+	return matches, insertions
+
+
+class _RowMerger:
+	table_name: str
+	entity_type: Type[Entity]
+	conflicts: list[Conflict]
+
+	def __init__(self, table_name: str, entity_type: Type[Entity], conflicts: list[Conflict]):
+		self.table_name = table_name
+		self.entity_type = entity_type
+		self.conflicts = conflicts
+		primary = [entity_type._fields[pkey] for pkey in entity_type._primary]
+		self._key_slices = [slice(field_info.offset, field_info.offset+field_info.len_bytes) for field_info in primary]
+		covered = {b for field_info in entity_type._fields.values() for b in range(field_info.offset, field_info.offset+field_info.len_bytes)}
+		self._gaps = [b for b in range(entity_type._length()) if b not in covered]
+
+	def keyed(self, rows: list[bytes]) -> dict[tuple[bytes, int], bytes]:
+		# primary key bytes and how many rows with the same key came before
+		result = {}
+		seen = {}
+		key_slices = self._key_slices
+		for row in rows:
+			key = b''.join(row[s] for s in key_slices) if len(key_slices) > 1 else row[key_slices[0]]
+			count = seen.get(key, 0)
+			seen[key] = count + 1
+			result[(key, count)] = row
+		return result
+
+	def _decode(self, row: bytes | None) -> Entity | None:
+		return self.entity_type(row, game_data=None) if row is not None else None
+
+	def _report_key(self, key, row: bytes):
+		if isinstance(key, int):
+			return key
+		entity = self._decode(row)
+		return tuple(getattr(entity, pkey) for pkey in self.entity_type._primary)
+
+	def row(self, key, base: bytes | None, ours: bytes | None, theirs: bytes | None) -> bytes | None:
+		row, conflict = _pick(base, ours, theirs)
+		if not conflict:
+			return row
+		if base is None or ours is None or theirs is None:
+			self.conflicts.append(Conflict(self.table_name, self._report_key(key, ours or theirs or base), None, self._decode(base), self._decode(ours), self._decode(theirs)))
+			return ours
+
+		merged = bytearray(ours)
+		decoded = None
+		for field_name, field_info in self.entity_type._fields.items():
+			s = slice(field_info.offset, field_info.offset+field_info.len_bytes)
+			value, conflict = _pick(base[s], ours[s], theirs[s])
+			if conflict:
+				if decoded is None:
+					decoded = [self._decode(row) for row in (base, ours, theirs)]
+				self.conflicts.append(Conflict(self.table_name, self._report_key(key, ours), field_name, *(getattr(entity, field_name) for entity in decoded)))
+			else:
+				merged[s] = value
+		for b in self._gaps:
+			if ours[b] == base[b]:
+				merged[b] = theirs[b]
+		return bytes(merged)
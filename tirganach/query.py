@@ -0,0 +1,80 @@
+import operator
+from typing import Callable
+
+
+# small expressions over the fields of a row, e.g. col('mana') * 1.2 or col('level') >= 10
+# used by Table.update (and anywhere else that takes a predicate or a computed value)
+
+class Expression:
+	func: Callable
+	operands: tuple
+
+	def __init__(self, func: Callable, *operands):
+		self.func = func
+		self.operands = operands
+
+	def evaluate(self, row):
+		return self.func(*(o.evaluate(row) if isinstance(o, Expression) else o for o in self.operands))
+
+	def __call__(self, row):
+		return self.evaluate(row)
+
+	def _binary(self, func, other, reflected=False):
+		return Expression(func, other, self) if reflected else Expression(func, self, other)
+
+	def __add__(self, other): return self._binary(operator.add, other)
+	def __radd__(self, other): return self._binary(operator.add, other, reflected=True)
+	def __sub__(self, other): return self._binary(operator.sub, other)
+	def __rsub__(self, other): return self._binary(operator.sub, other, reflected=True)
+	def __mul__(self, other): return self._binary(operator.mul, other)
+	def __rmul__(self, other): return self._binary(operator.mul, other, reflected=True)
+	def __truediv__(self, other): return self._binary(operator.truediv, other)
+	def __floordiv__(self, other): return self._binary(operator.floordiv, other)
+	def __mod__(self, other): return self._binary(operator.mod, other)
+	def __neg__(self): return Expression(operator.neg, self)
+
+	def __eq__(self, other): return self._binary(operator.eq, other)
+	def __ne__(self, other): return self._binary(operator.ne, other)
+	def __lt__(self, other): return self._binary(operator.lt, other)
+	def __le__(self, other): return self._binary(operator.le, other)
+	def __gt__(self, other): return self._binary(operator.gt, other)
+	def __ge__(self, other): return self._binary(operator.ge, other)
+	def __and__(self, other): return self._binary(lambda a, b: a and b, other)
+	def __or__(self, other): return self._binary(lambda a, b: a or b, other)
+	def __invert__(self): return Expression(operator.not_, self)
+
+	__hash__ = None
+
+	def clip(self, lower=None, upper=None) -> 'Expression':
+		def clip(value):
+			if lower is not None and value < lower:
+				return lower
+			if upper is not None and value > upper:
+				return upper
+			return value
+		return Expression(clip, self)
+
+	def round(self) -> 'Expression':
+		return Expression(round, self)
+
+	def isin(self, values) -> 'Expression':
+		values = frozenset(values)
+		return Expression(lambda value: value in values, self)
+
+
+class Column(Expression):
+	name: str
+
+	def __init__(self, name: str):
+		self.name = name
+		super().__init__(operator.attrgetter(name))
+
+	def evaluate(self, row):
+		return self.func(row)
+
+	def __repr__(self):
+		return f"col({self.name!r})"
+
+
+def col(name: str) -> Column:
+	return Column(name)
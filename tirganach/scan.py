@@ -0,0 +1,111 @@
+import io
+from os import PathLike
+from typing import Type, Callable, Iterator
+
+from tirganach.catalog import catalog, CatalogEntry
+from tirganach.entities import Entity
+from tirganach.query import Expression
+from tirganach.structure import GameData
+
+
+# reads one table straight from the file in chunks, without loading the GameData
+# rows are only decoded as far as the predicate needs them, and fully only if they match
+
+CHUNK_SIZE = 1 << 20
+
+
+class RawRow:
+	# looks like a row to predicates, decodes a field only when it's accessed
+	__slots__ = ('_entity_type', '_buffer', '_offset')
+
+	def __init__(self, entity_type: Type[Entity], buffer: bytes, offset: int):
+		self._entity_type = entity_type
+		self._buffer = buffer
+		self._offset = offset
+
+	def __getattr__(self, name):
+		field_info = self._entity_type._fields.get(name)
+		if field_info is None:
+			raise AttributeError(f"{self._entity_type.__name__} has no field {name}")
+		start = self._offset + field_info.offset
+		return field_info.parse_bytes(self._buffer[start: start+field_info.len_bytes], parent_entity=self)
+
+
+class Scanner:
+	source: str | PathLike[str] | bytes
+	entry: CatalogEntry
+	entity_type: Type[Entity]
+	row_length: int
+
+	def __init__(self, source: str | PathLike[str] | bytes, table_name: str, game_data_class: Type[GameData] = GameData):
+		self.source = source
+		entries = catalog(source, game_data_class)
+		if table_name not in entries:
+			raise ValueError(f"Unknown table {table_name}")
+		self.entry = entries[table_name]
+		self.entity_type = self.entry.entity_type
+		self.row_length = self.entity_type._length()
+		if self.entry.rows is None:
+			raise ValueError(f"Table {table_name}: {self.entry.length} bytes is not a multiple of the row length {self.row_length}")
+
+	def __repr__(self):
+		return f"<[Scanner] {self.entry.name}: {len(self)} rows>"
+
+	def __len__(self):
+		return self.entry.rows
+
+	def _open(self):
+		if isinstance(self.source, PathLike) or isinstance(self.source, str):
+			return io.open(self.source, 'rb')
+		return io.BytesIO(self.source)
+
+	def __getitem__(self, idx: int) -> Entity:
+		if idx < 0:
+			idx += len(self)
+		if not 0 <= idx < len(self):
+			raise IndexError("table index out of range")
+		with self._open() as fd:
+			fd.seek(self.entry.offset + idx * self.row_length)
+			return self.entity_type(fd.read(self.row_length), game_data=None)
+
+	def __iter__(self) -> Iterator[Entity]:
+		return self.scan()
+
+	def scan(self, where: dict | Callable | Expression = None, fields: list[str] = None) -> Iterator[Entity | dict]:
+		# where: field values to match, a predicate or an expression, see Table.update
+		# fields: only decode these of the matching rows and yield dicts instead of rows
+		unknown = [f for f in list(fields or []) + list(where if isinstance(where, dict) else []) if f not in self.entity_type._fields]
+		if unknown:
+			raise ValueError(f"{self.entity_type.__name__} has no field {unknown[0]}")
+		if isinstance(where, dict):
+			conditions = where
+			predicate = lambda row: all(getattr(row, k) == v for k, v in conditions.items())
+		elif isinstance(where, Expression):
+			predicate = where.evaluate
+		else:
+			predicate = where
+		return self._rows(predicate, fields)
+
+	def _rows(self, predicate: Callable, fields: list[str]) -> Iterator[Entity | dict]:
+		rows_per_chunk = max(1, CHUNK_SIZE // self.row_length)
+		with self._open() as fd:
+			fd.seek(self.entry.offset)
+			remaining = len(self)
+			while remaining:
+				count = min(remaining, rows_per_chunk)
+				buffer = fd.read(count * self.row_length)
+				if len(buffer) < count * self.row_length:
+					raise ValueError(f"File ends inside of table {self.entry.name}")
+				remaining -= count
+				for offset in range(0, len(buffer), self.row_length):
+					raw_row = RawRow(self.entity_type, buffer, offset)
+					if predicate is not None and not predicate(raw_row):
+						continue
+					if fields is not None:
+						yield {f: getattr(raw_row, f) for f in fields}
+					else:
+						yield self.entity_type(buffer[offset: offset+self.row_length], game_data=None)
+
+
+def scan(source: str | PathLike[str] | bytes, table_name: str, where: dict | Callable | Expression = None, fields: list[str] = None) -> Iterator[Entity | dict]:
+	return Scanner(source, table_name).scan(where=where, fields=fields)
@@ -0,0 +1,202 @@
+import asyncio
+import json
+from collections import OrderedDict
+from enum import Enum
+from os import PathLike
+from types import UnionType
+from typing import get_args
+from urllib.parse import urlsplit, parse_qsl, unquote
+
+from tirganach.entities import Entity, Localisation
+from tirganach.fields import Field, IntegerField, BoolField, EnumField
+from tirganach.indexes import RelationView
+from tirganach.structure import GameData
+from tirganach.types import UnknownEnumMember
+
+
+# local json server, so tools don't have to load the file themselves
+#   GET /status                              loaded yet?
+#   GET /tables                              table names and row counts
+#   GET /tables/<table>?<field>=<value>      rows matching all given fields
+#   GET /tables/<table>/<key>/<key>          row by primary key, values in the order of table.primary_keys
+#   GET /search?q=<text>&language=<name>     localisation rows containing the text
+# rows can take expand=<relation>,<relation> and (for lists) limit=<n>
+
+
+class RequestError(Exception):
+	status: int
+
+	def __init__(self, status: int, message: str):
+		super().__init__(message)
+		self.status = status
+
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+def _parse_value(field: Field, text: str):
+	try:
+		if isinstance(field, BoolField):
+			return text.lower() in ('1', 'true', 'yes')
+		if isinstance(field, IntegerField):
+			return int(text)
+		if isinstance(field, EnumField):
+			# fields whose type depends on another one (item_subtype) can hold a member of any of their enums
+			data_types = get_args(field.data_type) if isinstance(field.data_type, UnionType) else (field.data_type,)
+			enum_types = [data_type for data_type in data_types if isinstance(data_type, type) and issubclass(data_type, Enum)]
+			if enum_types:
+				return next(enum_type[text.upper()] for enum_type in enum_types if text.upper() in enum_type.__members__)
+	except (ValueError, KeyError, StopIteration):
+		raise RequestError(400, f"Invalid value {text!r}")
+	return text
+
+
+def _to_json(value):
+	if isinstance(value, Entity):
+		return {field_name: _to_json(getattr(value, field_name)) for field_name in value._fields}
+	if isinstance(value, (list, tuple, RelationView)):
+		return [_to_json(v) for v in value]
+	if isinstance(value, (Enum, UnknownEnumMember)):
+		return value.name if value.name is not None else value.value
+	return value
+
+
+class Server:
+	source: str | PathLike[str]
+	game_data: GameData = None
+	cache_size: int
+
+	def __init__(self, source: str | PathLike[str], cache_size: int = 256):
+		self.source = source
+		self.cache_size = cache_size
+		self._cache = OrderedDict() # request target -> response body, least recently used first
+		self._loading = None
+		self._texts = None # language -> [(lowercase text, row)]
+
+	def _load(self):
+		# runs in a worker thread, the event loop keeps accepting connections meanwhile
+		from tirganach.versions import open as open_game_data
+		game_data = open_game_data(self.source)
+		game_data.schema()
+		texts = {}
+		for row in game_data.localisation:
+			texts.setdefault(row.language, []).append((row.text.lower(), row))
+		self._texts = texts
+		self.game_data = game_data
+
+	async def start(self, host: str = '127.0.0.1', port: int = 8151) -> asyncio.AbstractServer:
+		self._loading = asyncio.get_running_loop().run_in_executor(None, self._load)
+		return await asyncio.start_server(self._handle_connection, host, port)
+
+	async def serve(self, host: str = '127.0.0.1', port: int = 8151):
+		server = await self.start(host, port)
+		print(f"Serving {self.source} on http://{host}:{port}")
+		async with server:
+			await server.serve_forever()
+
+	async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+		try:
+			while True:
+				request_line = await reader.readline()
+				if not request_line.strip():
+					break
+				headers = {}
+				while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+					key, _, value = line.decode('latin-1').partition(':')
+					headers[key.strip().lower()] = value.strip()
+				method, target, version = request_line.decode('latin-1').split()
+				status, body = await self._respond(method, target)
+				keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+				writer.write(
+					f"{version} {status} {REASONS[status]}\r\n"
+					f"Content-Type: application/json\r\n"
+					f"Content-Length: {len(body)}\r\n"
+					f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + body
+				)
+				await writer.drain()
+				if not keep_alive:
+					break
+		except (ConnectionError, ValueError):
+			pass
+		finally:
+			writer.close()
+
+	async def _respond(self, method: str, target: str) -> tuple[int, bytes]:
+		if method != 'GET':
+			return 405, json.dumps({'error': f"{method} not supported"}).encode()
+		if urlsplit(target).path == '/status':
+			return 200, json.dumps({'loaded': self.game_data is not None}).encode()
+		try:
+			await asyncio.shield(self._loading)
+		except Exception as e:
+			return 500, json.dumps({'error': f"Could not load {self.source}: {e}"}).encode()
+
+		cached = self._cache.get(target)
+		if cached is not None:
+			self._cache.move_to_end(target)
+			return 200, cached
+		try:
+			body = json.dumps(self._query(target)).encode()
+		except RequestError as e:
+			return e.status, json.dumps({'error': str(e)}).encode()
+		except Exception as e:
+			return 500, json.dumps({'error': f"{e.__class__.__name__}: {e}"}).encode()
+		self._cache[target] = body
+		if len(self._cache) > self.cache_size:
+			self._cache.popitem(last=False)
+		return 200, body
+
+	def _query(self, target: str):
+		url = urlsplit(target)
+		path = [unquote(part) for part in url.path.strip('/').split('/') if part]
+		params = dict(parse_qsl(url.query))
+		expand = [name for name in params.pop('expand', '').split(',') if name]
+		limit = params.pop('limit', None)
+		if limit is not None:
+			if not limit.isdigit():
+				raise RequestError(400, f"Invalid limit {limit!r}")
+			limit = int(limit)
+
+		if path == ['tables']:
+			return {name: len(table) for name, table in self.game_data.tables().items()}
+		if path == ['search']:
+			return self._search(params, expand, limit)
+		if len(path) >= 2 and path[0] == 'tables':
+			table = self.game_data.tables().get(path[1])
+			if table is None:
+				raise RequestError(404, f"No table {path[1]!r}")
+			fields = table.entity_type._fields
+			if len(path) > 2:
+				keys = path[2:]
+				if len(keys) != len(table.primary_keys):
+					raise RequestError(400, f"{path[1]} needs {len(table.primary_keys)} key values: {', '.join(table.primary_keys)}")
+				found = table._lookup(tuple(_parse_value(fields[k], v) for k, v in zip(table.primary_keys, keys)))
+				if not found:
+					raise RequestError(404, f"No row {'/'.join(keys)} in {path[1]}")
+				return self._row(found[0], expand)
+			unknown = [k for k in params if k not in fields]
+			if unknown:
+				raise RequestError(400, f"{path[1]} has no field {unknown[0]!r}")
+			rows = table.where(**{k: _parse_value(fields[k], v) for k, v in params.items()}) if params else list(table)
+			return [self._row(row, expand) for row in rows[:limit]]
+		raise RequestError(404, f"Unknown path {url.path}")
+
+	def _search(self, params: dict, expand: list, limit: int):
+		query = params.get('q', '').lower()
+		if not query:
+			raise RequestError(400, "Missing search text q")
+		language = _parse_value(Localisation._fields['language'], params.get('language', 'ENGLISH'))
+		rows = [row for text, row in self._texts.get(language, []) if query in text]
+		return [self._row(row, expand) for row in rows[:limit]]
+
+	def _row(self, row: Entity, expand: list) -> dict:
+		result = _to_json(row)
+		for name in expand:
+			if name not in row._relations:
+				raise RequestError(400, f"{row.__class__.__name__} has no relation {name!r}")
+			result[name] = _to_json(getattr(row, name))
+		return result
+
+
+def serve(source: str | PathLike[str], host: str = '127.0.0.1', port: int = 8151, cache_size: int = 256):
+	asyncio.run(Server(source, cache_size).serve(host, port))
@@ -0,0 +1,237 @@
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_left, bisect_right
+from os import PathLike
+from typing import Type, Generic, TypeVar
+
+from tirganach.entities import Entity
+from tirganach.structure import GameData, Schema
+
+T = TypeVar('T', bound=Entity)
+
+# read only GameData for many processes at once
+# the file is written once, every process maps it read-only and shares the pages with all others
+# layout:
+#   8 bytes magic, offset and length of the directory (8 bytes each)
+#   the original GameData.cff bytes (so the table bodies can be read in place)
+#   one array of little endian uint32 row numbers per index, sorted by the key bytes of the rows
+#   directory (json): where the tables and their indexes are
+
+MAGIC = b'TIRGSHM1'
+HEADER = struct.Struct('<8sQQ')
+
+
+class SharedTable(Generic[T]):
+	name: str
+	entity_type: Type[T]
+	primary_keys: tuple
+	_game_data: 'SharedGameData'
+	_body: memoryview
+	_row_length: int
+	_indexes: dict[tuple, memoryview] # key fields -> row numbers sorted by key
+
+	def __init__(self, game_data: 'SharedGameData', name: str, entity_type: Type[T], header: memoryview, body: memoryview, indexes: dict[tuple, memoryview]):
+		self._game_data = game_data
+		self.name = name
+		self.entity_type = entity_type
+		self.primary_keys = entity_type._primary
+		self._header = header
+		self._body = body
+		self._row_length = entity_type._length()
+		self._indexes = indexes
+
+	def __repr__(self):
+		return f"<[SharedTable] {self.entity_type.__name__}>"
+
+	def __len__(self):
+		return len(self._body) // self._row_length
+
+	def _row(self, idx: int) -> T:
+		offset = idx * self._row_length
+		return self.entity_type(bytes(self._body[offset: offset+self._row_length]), game_data=self._game_data)
+
+	def __getitem__(self, item):
+		if isinstance(item, slice):
+			return [self._row(idx) for idx in range(*item.indices(len(self)))]
+		if item < 0:
+			item += len(self)
+		if not 0 <= item < len(self):
+			raise IndexError("table index out of range")
+		return self._row(item)
+
+	def __iter__(self):
+		for idx in range(len(self)):
+			yield self._row(idx)
+
+	def _to_bytes(self):
+		return bytes(self._header) + bytes(self._body)
+
+	def _key_bytes(self, fields: tuple, values: tuple) -> bytes:
+		return b''.join(self.entity_type._fields[field].dump_bytes(value) for field, value in zip(fields, values))
+
+	def _row_key(self, fields: tuple, idx: int) -> bytes:
+		offset = idx * self._row_length
+		result = b''
+		for field in fields:
+			field_info = self.entity_type._fields[field]
+			result += self._body[offset+field_info.offset: offset+field_info.offset+field_info.len_bytes]
+		return result
+
+	def _search(self, fields: tuple, values: tuple) -> range:
+		# positions in the index of all rows with that key
+		index = self._indexes[fields]
+		key = self._key_bytes(fields, values)
+		row_key = lambda idx: self._row_key(fields, idx)
+		return range(bisect_left(index, key, key=row_key), bisect_right(index, key, key=row_key))
+
+	def where(self, **kwargs) -> list[T]:
+		fields = tuple(sorted(kwargs))
+		if fields in self._indexes:
+			index = self._indexes[fields]
+			return [self._row(index[pos]) for pos in self._search(fields, tuple(kwargs[f] for f in fields))]
+		# compare the raw bytes, only rows that match get decoded
+		key = self._key_bytes(fields, tuple(kwargs[f] for f in fields))
+		return [self._row(idx) for idx in range(len(self)) if self._row_key(fields, idx) == key]
+
+	def _own(self, row: T) -> T:
+		return row
+
+	def _grouped(self, relation, keys: tuple, values: tuple) -> list[T]:
+		rows = self.where(**dict(zip(keys, values)))
+		return sorted(rows, key=relation.sort) if relation.sort else rows
+
+	def _lookup(self, ordered_pkeyvals: tuple) -> list[T]:
+		found = self._search(self.primary_keys, ordered_pkeyvals)
+		# like the index of a normal table, the last one wins
+		return [self._row(self._indexes[self.primary_keys][found[-1]])] if found else []
+
+
+class SharedGameData:
+	_epoch: int = 0
+	_read_only: bool = True
+	_game_data_class: Type[GameData] = GameData
+	_header: bytes
+
+	def __init__(self, path: str | PathLike[str]):
+		# attaching is just mapping the file and reading the directory, nothing gets parsed
+		self.path = path
+		with open(path, 'rb') as fd:
+			self._mmap = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+		buffer = memoryview(self._mmap)
+		magic, directory_offset, directory_length = HEADER.unpack_from(buffer, 0)
+		assert magic == MAGIC
+		directory = json.loads(bytes(buffer[directory_offset: directory_offset+directory_length]))
+
+		file_offset, file_length = directory['file']
+		self._file = buffer[file_offset: file_offset+file_length]
+		self._header = bytes(self._file[0:20])
+		entity_types = self.schema().entity_types
+		for table_name, info in directory['tables'].items():
+			indexes = {
+				tuple(fields.split(',')): buffer[offset: offset + 4*count].cast('I')
+				for fields, (offset, count) in info['indexes'].items()
+			}
+			header = self._file[info['offset']-12: info['offset']]
+			body = self._file[info['offset']: info['offset']+info['length']]
+			setattr(self, table_name, SharedTable(self, table_name, entity_types[table_name], header, body, indexes))
+
+	def __reduce__(self):
+		# other processes attach to the same file
+		return SharedGameData, (self.path,)
+
+	@classmethod
+	def create(cls, game_data: GameData, path: str | PathLike[str]) -> 'SharedGameData':
+		raw = game_data._to_bytes()
+		schema = game_data.schema()
+
+		tables = {}
+		tmp_path = f"{path}.tmp"
+		with open(tmp_path, 'wb') as fd:
+			fd.write(HEADER.pack(MAGIC, 0, 0))
+			fd.write(raw)
+			position = HEADER.size + len(raw)
+
+			offset = 20
+			for table_name, entity_type in schema.entity_types.items():
+				length = int.from_bytes(raw[offset+6: offset+10], byteorder='little', signed=False)
+				offset += 12
+				body = raw[offset: offset+length]
+				indexes = {}
+				for fields in cls._index_fields(schema, table_name):
+					rows = cls._sorted_rows(entity_type, body, fields)
+					padding = -position % 4
+					fd.write(b'\x00' * padding)
+					position += padding
+					indexes[','.join(fields)] = (position, len(rows))
+					fd.write(struct.pack(f'<{len(rows)}I', *rows))
+					position += 4 * len(rows)
+				tables[table_name] = {'offset': offset, 'length': length, 'indexes': indexes}
+				offset += length
+
+			directory = json.dumps({'file': [HEADER.size, len(raw)], 'tables': tables}).encode()
+			fd.write(directory)
+			fd.seek(0)
+			fd.write(HEADER.pack(MAGIC, position, len(directory)))
+		os.replace(tmp_path, path)
+		return cls(path)
+
+	@staticmethod
+	def _index_fields(schema: Schema, table_name: str) -> list[tuple]:
+		# primary key, plus the fields any relation looks up this table by
+		entity_type = schema.entity_types[table_name]
+		result = [entity_type._primary] if entity_type._primary else []
+		for relation in schema.referrers[table_name]:
+			for keys, sources, indexed in relation._lookups:
+				fields = tuple(sorted(keys))
+				if fields not in result:
+					result.append(fields)
+		return result
+
+	@staticmethod
+	def _sorted_rows(entity_type: Type[Entity], body: bytes, fields: tuple) -> list[int]:
+		row_length = entity_type._length()
+		field_infos = [entity_type._fields[f] for f in fields]
+		def key(idx):
+			offset = idx * row_length
+			return b''.join(body[offset+f.offset: offset+f.offset+f.len_bytes] for f in field_infos)
+		return sorted(range(len(body) // row_length), key=key)
+
+	@classmethod
+	def schema(cls) -> Schema:
+		return cls._game_data_class.schema()
+
+	@classmethod
+	def table_info(cls):
+		return cls.schema().table_info
+
+	def tables(self):
+		return {name: getattr(self, name) for name in self.schema().table_info}
+
+	def get_table(self, entity_type: Type[Entity]) -> SharedTable:
+		name = self.schema().table_names.get(entity_type)
+		if name:
+			return getattr(self, name)
+
+	def _to_bytes(self):
+		return bytes(self._file)
+
+	def save(self, filename):
+		with open(filename, 'wb') as fd:
+			fd.write(self._file)
+
+	def _before_write(self, row: Entity):
+		raise PermissionError("Shared GameData is read-only, load a GameData to make changes")
+
+	def close(self):
+		# tables of this instance can't be used anymore afterwards
+		for table_name in self.schema().table_info:
+			table = self.__dict__.pop(table_name, None)
+			if table is not None:
+				table._header.release()
+				table._body.release()
+				for index in table._indexes.values():
+					index.release()
+		self._file.release()
+		self._mmap.close()
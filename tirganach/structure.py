@@ -1,6 +1,16 @@
+import asyncio
 import hashlib
+import io
+import os
+import sys
+import threading
+import weakref
+from contextlib import contextmanager, nullcontext
+from enum import Enum
 from os import PathLike
-from typing import Type, get_origin, get_args, TypeVar, Generic
+from typing import Type, get_origin, get_args, TypeVar, Generic, Iterable, BinaryIO, Callable
+
+from tirganach.fields import Relation, IntegerField
 
 from tirganach.entities import Armor, Localisation, Entity, ItemRequirement, Building, BuildingRequirement, Creature, \
 	CreatureStats, CreatureResourceRequirement, CreatureEquipment, CreatureSkill, Item, CreatureSpell, Spell, HeroSpell, \
@@ -8,23 +18,75 @@ from tirganach.entities import Armor, Localisation, Entity, ItemRequirement, Bui
 	SkillRequirement, ResourceName, Level, NPCName, Map, Portal, Description, AdvancedDescription, Quest, \
 	WeaponTypeName, WeaponMaterialName, ItemSet, Unknown3, Head, CreatureDrop, BuildingGraphics, MerchantInventory, \
 	MerchantInventoryItem, MerchantPriceMultiplier, Object, ObjectGraphics, ObjectLoot, Unknown40, Terrain, Unknown47
+from tirganach.history import ChangeLog, FieldChange, RowInsert, RowDelete
+from tirganach.indexes import RangeIndex, GroupIndex, ReferenceIndex, IdAllocator
+from tirganach.query import Expression
+from tirganach.types import Language
+from tirganach.views import View
 
 T = TypeVar('T', bound=Entity)
 
+DIGEST_BLOCK = 256 # rows per block of a table digest
+
+
+class Progress:
+	# one event per table while loading or saving
+	table: str
+	bytes_done: int # including this table
+	bytes_total: int
+	rows_done: int # in all tables so far, skipped tables don't count
+
+	def __init__(self, table: str, bytes_done: int, bytes_total: int, rows_done: int):
+		self.table = table
+		self.bytes_done = bytes_done
+		self.bytes_total = bytes_total
+		self.rows_done = rows_done
+
+	def __repr__(self):
+		return f"<[Progress] {self.table}: {self.bytes_done}/{self.bytes_total} bytes, {self.rows_done} rows>"
+
+
+class Cancelled(Exception):
+	pass
+
+
+class Validation(Enum):
+	NONE = 'none' # trust the file
+	TABLE = 'table' # checks over whole table bodies at once, nothing per row
+	STRICT = 'strict' # additionally every row and cell on its own
+
 
 class Table(list[T], Generic[T]):
 	_header: bytearray
 	_game_data: 'GameData'
 
+	# snapshots: the rows in the list are shared with the parent table until they are first accessed here
+	_parent: 'Table' = None
+	_forks: dict = None # shared row -> our own copy of it
+
+	# change tracking
+	_hash: bytes = None # content hash over the block hashes, dropped whenever the table changes
+	_blocks: list = None # hashes of DIGEST_BLOCK rows each, None for blocks with a changed row
+	_positions: dict = None # slot -> index as of the last digest, dropped when rows are added, removed or reordered
+	_modified: bool = False
+	_loaded: tuple = () # the rows as they were loaded from the file
+
+	name: str = None
 	offset: int
 	entity_type: Type[T]
 	entity_index: dict[tuple, T] = None
+	_shadowed: dict[tuple, list[T]] = None # rows whose key another row already has in the entity index, next in line for it
+	range_indexes: dict[str, RangeIndex] = None # field name -> sorted index, only the ones asked for
+	group_indexes: dict[tuple, GroupIndex] = None # fields -> rows grouped by them, built when a relation first needs them
+	reference_indexes: dict[tuple, ReferenceIndex] = None # fields -> rows by the values they reference, see GameData.referrers
+	id_allocators: dict[str, IdAllocator] = None # primary key field -> free values, built by the first new() that needs them
 	primary_keys: tuple # sorted alphabetically!
 
-	def __init__(self, raw_bytes: bytes | bytearray, entity_type: Type[T], game_data: 'GameData'):
+	def __init__(self, raw_bytes: bytes | bytearray, entity_type: Type[T], game_data: 'GameData', name: str = None):
 		self.entity_type = entity_type
-		self.primary_keys = tuple(sorted(field_name for field_name, field in entity_type._fields.items() if field.primary))
+		self.primary_keys = entity_type._primary
 		self._game_data = game_data
+		self.name = name
 
 		offset = 0
 
@@ -35,64 +97,680 @@ class Table(list[T], Generic[T]):
 
 		table_size_bytes = int.from_bytes(header[6: 10], byteorder='little', signed=False)
 		table_row_length = entity_type._length()
-		table_size_rows = int(table_size_bytes / table_row_length)
-		assert table_size_rows == (table_size_bytes / table_row_length)
-		super().__init__([None] * table_size_rows)
+		table_size_rows = table_size_bytes // table_row_length
+		validation = game_data._validation if game_data is not None else Validation.TABLE
+		if validation is not Validation.NONE:
+			self._validate(raw_bytes, table_size_bytes)
 
-		for idx in range(0, table_size_rows):
-			new_instance: entity_type = entity_type(raw_bytes[offset:offset+table_row_length], game_data=self._game_data)
-			self[idx] = new_instance
-			offset += table_row_length
+		rows = []
+		try:
+			for idx in range(0, table_size_rows):
+				new_instance: entity_type = entity_type(raw_bytes[offset:offset+table_row_length], game_data=self._game_data)
+				rows.append(new_instance)
+				offset += table_row_length
+		except ValueError as e:
+			# strings are checked as they are decoded (StringField.parse_bytes), whatever the validation
+			raise ValueError(f"Table {self.name}, row {idx}: {e}") from None
+		super().__init__(rows)
+		self._loaded = tuple(rows)
 
-		assert offset == len(raw_bytes)
+		if validation is Validation.STRICT:
+			for row in rows:
+				row._validate()
 
 		self.create_index()
 
-	def _to_bytes(self):
+	def _validate(self, raw_bytes: bytes | bytearray, table_size_bytes: int):
+		# whole table at once, one pass per field over the body
 		table_row_length = self.entity_type._length()
+		if table_size_bytes % table_row_length:
+			raise ValueError(f"Table {self.name}: {table_size_bytes} bytes is not a multiple of the row length {table_row_length}")
+		if len(raw_bytes) != 12 + table_size_bytes:
+			raise ValueError(f"Table {self.name}: header says {table_size_bytes} bytes, got {len(raw_bytes) - 12}")
+		body = raw_bytes[12:]
+		for field_name, field_info in self.entity_type._fields.items():
+			try:
+				field_info.check_column(body, table_row_length)
+			except ValueError as e:
+				raise ValueError(f"Table {self.name}, field {field_name}: {e}") from None
 
-		offset = 0
-		result = bytearray()
+	def _to_bytes(self):
+		table_row_length = self.entity_type._length()
 
 		# header
-		self._header[6: 10] = (len(self) * table_row_length).to_bytes(length=4, byteorder='little', signed=False)
-		result += self._header
-		offset += 12
+		self._header = self._current_header()
+		rows = [self._peek(row) for row in list.__iter__(self)]
+		validation = self._game_data._validation if self._game_data is not None else Validation.TABLE
+		if validation is Validation.STRICT:
+			for row in rows:
+				if not isinstance(row, self.entity_type):
+					raise ValueError(f"Table {self.name} contains {row!r}, expected {self.entity_type.__name__}")
 
-		for row in self:
-			assert isinstance(row, self.entity_type)
-			result += row._to_bytes()
-			offset += table_row_length
-			assert len(result) == offset
+		result = bytearray(self._header)
+		result += b''.join(row._to_bytes() for row in rows)
+		if validation is not Validation.NONE and len(result) != 12 + len(rows) * table_row_length:
+			raise ValueError(f"Table {self.name}: rows add up to {len(result) - 12} bytes instead of {len(rows) * table_row_length}")
 
 		return result
 
 	def _to_hex(self):
 		return ' '.join(format(byte, '02x') for byte in self._to_bytes())
 
+	def _current_header(self) -> bytearray:
+		header = bytearray(self._header)
+		header[6: 10] = (len(self) * self.entity_type._length()).to_bytes(length=4, byteorder='little', signed=False)
+		return header
+
 	def __repr__(self):
 		return f"<[Table] {self.entity_type.__name__}>"
 
+	def __reduce__(self):
+		# as it would be saved, arrives as a table of its own (not attached to any GameData)
+		return _unpickle_table, (self.entity_type, self.name, bytes(self._to_bytes()))
+
+	# content hashes
+
+	def digest(self) -> bytes:
+		# merkle style: hash of the header and the hashes of blocks of rows, which hash the (cached) row hashes
+		# writing a row only invalidates its block, so after an edit only that block is hashed again
+		if self._hash is None:
+			if self._blocks is None:
+				self._positions = {slot: idx for idx, slot in enumerate(list.__iter__(self))}
+				self._blocks = [None] * -(-len(self) // DIGEST_BLOCK)
+			for block, digest in enumerate(self._blocks):
+				if digest is None:
+					hsh = hashlib.md5()
+					for slot in list.__getitem__(self, slice(block * DIGEST_BLOCK, (block + 1) * DIGEST_BLOCK)):
+						hsh.update(self._peek(slot)._digest())
+					self._blocks[block] = hsh.digest()
+			self._hash = hashlib.md5(bytes(self._current_header()) + b''.join(self._blocks)).digest()
+		return self._hash
+
+	def _touch(self, row: T = None):
+		# row: only this row was written, otherwise rows were added, removed or reordered
+		self._hash = None
+		self._modified = True
+		if row is None:
+			self._blocks = None
+			self._positions = None
+		elif self._blocks is not None:
+			idx = self._positions.get(self._slot(row))
+			if idx is not None:
+				self._blocks[idx // DIGEST_BLOCK] = None
+
+	def _reorder(self):
+		self._touch()
+		self._regroup()
+
+	def changes(self) -> dict[str, list[T]]:
+		# compared to the table as it was loaded from the file
+		if not self._modified:
+			return {'inserted': [], 'deleted': [], 'modified': []}
+		loaded = set(self._loaded)
+		current = set(list.__iter__(self))
+		return {
+			'inserted': [self._own(row) for row in list.__iter__(self) if row not in loaded],
+			'deleted': [self._peek(row) for row in self._loaded if row not in current],
+			'modified': [self._own(row) for row in list.__iter__(self) if row in loaded and self._peek(row)._changed()]
+		}
+
 	def where(self, **kwargs) -> list[T]:
 		if self.primary_keys:
 			if set(kwargs.keys()) == set(self.primary_keys):
 				ordered_pkeyvals = tuple(kwargs[pkey] for pkey in self.primary_keys)
-				result = self.entity_index.get(ordered_pkeyvals)
-				if result:
-					return [result]
-				else:
-					return []
+				return self._lookup(ordered_pkeyvals)
+
+		candidates = list.__iter__(self)
+		if self.range_indexes:
+			for k, v in kwargs.items():
+				if k in self.range_indexes:
+					index = self.range_indexes[k]
+					candidates = [index.slots[pos] for pos in index.span(v, v)]
+					break
 
-		return [e for e in self if all(getattr(e, k) == v for k, v in kwargs.items())]
+		if self._parent is None:
+			return [e for e in candidates if all(getattr(e, k) == v for k, v in kwargs.items())]
+		# only rows that match get forked
+		return [self._own(e) for e in candidates if all(getattr(self._peek(e), k) == v for k, v in kwargs.items())]
+
+	def _select(self, where: dict | Callable | Expression = None) -> list[T]:
+		if where is None:
+			return list(self)
+		if isinstance(where, dict):
+			return self.where(**where)
+		predicate = where.evaluate if isinstance(where, Expression) else where
+		return [self._own(row) for row in list.__iter__(self) if predicate(self._peek(row))]
+
+	def update(self, where: dict | Callable | Expression = None, set: dict = None) -> list[T]:
+		# where: field values to match, a predicate or an expression like col('level') > 10; everything if omitted
+		# set: field name -> value, expression like col('mana') * 1.2, or a function of the row
+		# all new values are computed and checked per column before anything is written
+		rows = self._select(where)
+		columns = {}
+		for field_name, value in (set or {}).items():
+			field = self.entity_type._fields.get(field_name)
+			if field is None:
+				raise ValueError(f"{self.entity_type.__name__} has no field {field_name}")
+			if isinstance(value, Expression):
+				values = [value.evaluate(row) for row in rows]
+			elif callable(value) and not isinstance(value, Enum):
+				values = [value(row) for row in rows]
+			else:
+				values = [value] * len(rows)
+			try:
+				columns[field_name] = field.prepare_column(values)
+			except (TypeError, ValueError, OverflowError) as e:
+				raise e.__class__(f"{self.entity_type.__name__}.{field_name}: {e}") from e
+
+		with self._game_data.transaction() if self._game_data is not None else nullcontext():
+			for idx, row in enumerate(rows):
+				for field_name, values in columns.items():
+					setattr(row, field_name, values[idx])
+		return rows
+
+	def _lookup(self, ordered_pkeyvals: tuple) -> list[T]:
+		result = self.entity_index.get(ordered_pkeyvals)
+		if result:
+			return [self._own(result)]
+		else:
+			return []
 
 	def create_index(self):
-		self.entity_index = self.entity_index or {}
+		self.entity_index = {}
+		self._shadowed = {}
 		if self.primary_keys:
-			for element in self:
+			for element in list.__iter__(self):
 				if element:
-					ordered_pkeyvals = tuple(getattr(element, pkey) for pkey in self.primary_keys) #alphabetical
+					ordered_pkeyvals = self._index_key(self._peek(element)) #alphabetical
+					shadowed = self.entity_index.get(ordered_pkeyvals)
+					if shadowed is not None:
+						self._shadowed.setdefault(ordered_pkeyvals, []).append(shadowed)
 					self.entity_index[ordered_pkeyvals] = element
 
+	def _memory(self, seen: set) -> dict:
+		# see GameData.memory_report, every object is only counted by the first table that holds it
+		def size(obj) -> int:
+			if id(obj) in seen or isinstance(obj, (Enum, bool)) or obj is None:
+				return 0 # members and singletons are shared by everything
+			seen.add(id(obj))
+			return sys.getsizeof(obj)
+
+		rows = [self._peek(slot) for slot in list.__iter__(self)]
+		report = {
+			'rows': len(rows),
+			'disk': 12 + len(rows) * self.entity_type._length(),
+			'table': size(self) + size(self._loaded),
+			'objects': 0,
+			'raw': 0,
+			'fields': {},
+			'indexes': 0,
+		}
+		fields = {}
+		for row in rows:
+			report['objects'] += size(row) + size(row.__dict__)
+			report['raw'] += size(row._raw)
+			for field_name, field_info in self.entity_type._fields.items():
+				field_type = field_info.__class__.__name__
+				fields[field_type] = fields.get(field_type, 0) + size(row.__dict__[field_name])
+		report['fields'] = fields
+
+		if self.entity_index is not None:
+			report['indexes'] += size(self.entity_index) + sum(size(key) for key in self.entity_index)
+		for index in (self.range_indexes or {}).values():
+			report['indexes'] += size(index) + size(index.keys) + size(index.slots)
+		for index in (self.group_indexes or {}).values():
+			report['indexes'] += size(index) + size(index.groups) + sum(size(key) + size(group) for key, group in index.groups.items())
+		for index in (self.reference_indexes or {}).values():
+			report['indexes'] += size(index) + size(index.rows) + sum(size(key) + size(slots) for key, slots in index.rows.items())
+		if self._positions is not None:
+			report['indexes'] += size(self._positions) + size(self._blocks) + sum(size(block) for block in self._blocks if block is not None)
+		for allocator in (self.id_allocators or {}).values():
+			report['indexes'] += size(allocator) + size(allocator.used)
+		report['total'] = report['table'] + report['objects'] + report['raw'] + sum(fields.values()) + report['indexes']
+		return report
+
+	# new rows
+
+	def new(self, **fields) -> T:
+		return self.new_rows([fields])[0]
+
+	def new_rows(self, rows: Iterable[dict]) -> list[T]:
+		# rows from the given field values (all others 0), integer primary key fields that aren't given get the lowest free values
+		# everything is checked before anything is added, then all rows are appended at once, as one step to undo
+		rows = [dict(fields) for fields in rows]
+		entity_fields = self.entity_type._fields
+		for fields in rows:
+			for field_name in fields:
+				if field_name not in entity_fields:
+					raise ValueError(f"{self.entity_type.__name__} has no field {field_name}")
+		for field_name in {field_name for fields in rows for field_name in fields}:
+			given = [fields for fields in rows if field_name in fields]
+			for fields, value in zip(given, entity_fields[field_name].prepare_column([fields[field_name] for fields in given])):
+				fields[field_name] = value
+		# fields whose type depends on another one can't even be read from zeros without it
+		for field_name, field_info in entity_fields.items():
+			decider = getattr(field_info, 'type_decider', None)
+			if decider is None:
+				continue
+			for fields in rows:
+				if not hasattr(fields.get(decider), 'determine_sub_type'):
+					raise ValueError(f"{self.entity_type.__name__}.{field_name} depends on {decider}, which needs to be given (got {fields.get(decider)!r})")
+
+		if self.primary_keys:
+			keys = set()
+			for fields in rows:
+				if all(pkey in fields for pkey in self.primary_keys):
+					key = tuple(fields[pkey] for pkey in self.primary_keys)
+					if key in keys or key in self.entity_index:
+						raise ValueError(f"{self.name}: primary key {key} is already taken")
+					keys.add(key)
+			for pkey in self.primary_keys:
+				if isinstance(entity_fields[pkey], IntegerField) and any(pkey not in fields for fields in rows):
+					allocator = self._id_allocator(pkey)
+					for fields in rows:
+						if pkey not in fields:
+							fields[pkey] = allocator.take()
+
+		result = []
+		for fields in rows:
+			raw = bytearray(self.entity_type._length())
+			for field_name, value in fields.items():
+				field_info = entity_fields[field_name]
+				raw[field_info.offset: field_info.offset+field_info.len_bytes] = field_info.dump_bytes(value)
+			result.append(self.entity_type(bytes(raw), game_data=self._game_data))
+		with self._game_data.transaction() if self._game_data is not None else nullcontext():
+			self.extend(result)
+		return result
+
+	def _id_allocator(self, field: str) -> IdAllocator:
+		if self.id_allocators is None:
+			self.id_allocators = {}
+		allocator = self.id_allocators.get(field)
+		if allocator is None:
+			highest = self.entity_type._fields[field].value_range()[1]
+			slots = list(list.__iter__(self))
+			# the keys of rows deleted since loading stay taken, see IdAllocator
+			present = set(slots)
+			slots += [slot for slot in self._loaded if slot not in present]
+			allocator = self.id_allocators[field] = IdAllocator(field, slots, self._peek, highest)
+		return allocator
+
+	# ordered queries, fast with a range index on the field, otherwise the table is sorted for every call
+
+	def create_range_index(self, field: str) -> RangeIndex:
+		if field not in self.entity_type._fields:
+			raise ValueError(f"{self.entity_type.__name__} has no field {field}")
+		if self.range_indexes is None:
+			self.range_indexes = {}
+		index = self.range_indexes[field] = RangeIndex(field, list.__iter__(self), self._peek)
+		return index
+
+	def drop_range_index(self, field: str):
+		if self.range_indexes:
+			self.range_indexes.pop(field, None)
+
+	def _range_index(self, field: str) -> RangeIndex:
+		if self.range_indexes and field in self.range_indexes:
+			return self.range_indexes[field]
+		return RangeIndex(field, list.__iter__(self), self._peek)
+
+	def between(self, field: str, low=None, high=None, include_low: bool = True, include_high: bool = True) -> list[T]:
+		# ordered by the field, None for an open end
+		index = self._range_index(field)
+		return [self._own(index.slots[pos]) for pos in index.span(low, high, include_low, include_high)]
+
+	def ordered(self, field: str, reverse: bool = False) -> list[T]:
+		slots = self._range_index(field).slots
+		return [self._own(slot) for slot in (reversed(slots) if reverse else slots)]
+
+	def top(self, field: str, k: int, lowest: bool = False) -> list[T]:
+		# k rows with the highest (or lowest) values, best first
+		slots = self._range_index(field).slots
+		slots = slots[:k] if lowest else slots[:-k-1:-1] if k else []
+		return [self._own(slot) for slot in slots]
+
+	def _grouped(self, relation: Relation, keys: tuple, values: tuple) -> list:
+		# slots of all rows matching the values, in table order or sorted like the relation wants them
+		if self.group_indexes is None:
+			self.group_indexes = {}
+		index = self.group_indexes.get(keys)
+		if index is None or index.stale:
+			index = self.group_indexes[keys] = GroupIndex(keys, list.__iter__(self), self._peek)
+		return index.get(relation, values, self._peek)
+
+	def _reference_index(self, fields: tuple) -> ReferenceIndex:
+		if self.reference_indexes is None:
+			self.reference_indexes = {}
+		index = self.reference_indexes.get(fields)
+		if index is None:
+			index = self.reference_indexes[fields] = ReferenceIndex(fields, list.__iter__(self), self._peek)
+		return index
+
+	def _regroup(self, field: str = None):
+		# field: only that field of a row changed, otherwise rows were added, removed or reordered
+		for index in (self.group_indexes or {}).values():
+			if field is None:
+				index.stale = True
+			else:
+				index.changed(field)
+
+	def lowest(self, field: str) -> T | None:
+		slots = self._range_index(field).slots
+		return self._own(slots[0]) if slots else None
+
+	def highest(self, field: str) -> T | None:
+		slots = self._range_index(field).slots
+		return self._own(slots[-1]) if slots else None
+
+	# snapshots
+
+	def _snapshot(self, game_data: 'GameData') -> 'Table[T]':
+		table = list.__new__(self.__class__)
+		list.__init__(table, list.__iter__(self))
+		table.entity_type = self.entity_type
+		table.primary_keys = self.primary_keys
+		table.name = self.name
+		table._game_data = game_data
+		table._header = bytearray(self._header)
+		table._parent = self
+		table._forks = {}
+		table._hash = self._hash
+		table._blocks = list(self._blocks) if self._blocks is not None else None
+		table._positions = self._positions
+		table._modified = self._modified
+		table._loaded = self._loaded
+		table.entity_index = dict(self.entity_index) if self.entity_index is not None else None
+		table._shadowed = {key: list(slots) for key, slots in self._shadowed.items()} if self._shadowed else {}
+		if self.range_indexes:
+			table.range_indexes = {field: index.copy() for field, index in self.range_indexes.items()}
+		return table
+
+	def _peek(self, row: T) -> T:
+		# the version of a row in our list as it looks from this table, without forking it
+		if self._parent is None or row._game_data is self._game_data:
+			return row
+		own = self._forks.get(row)
+		if own is not None:
+			return own
+		return self._parent._peek(row)
+
+	def _own(self, row: T) -> T:
+		# like _peek, but hands out our own copy so that writes stay in this snapshot
+		if self._parent is None or row._game_data is self._game_data:
+			return row
+		own = self._forks.get(row)
+		if own is None:
+			own = self._forks[row] = self._parent._peek(row)._fork(self._game_data, row)
+		return own
+
+	def _slot(self, row: T) -> T:
+		# what stands for the row in our list: a fork stands in for its origin, unless it was put in there itself
+		# (a deleted row that was put back)
+		origin = row._origin
+		if origin is None or self._parent is None or self._forks.get(origin) is not row:
+			return row
+		return origin
+
+	def _preserve(self, row: T):
+		# the parent is about to write this row, keep the current version for us
+		if self._parent is not None:
+			shared = self._parent._slot(row)
+			if shared not in self._forks:
+				self._forks[shared] = row._fork(self._game_data, shared)
+
+	def _before_change(self):
+		if self._game_data is not None and self._game_data._snapshots:
+			self._game_data._fault_snapshots(self.name)
+
+	def _drop_forks(self, rows):
+		if self._parent is not None:
+			for row in rows:
+				self._forks.pop(row, None)
+
+	def _slot_index(self, row: T) -> int:
+		if self._parent is None:
+			return list.index(self, row)
+		for idx, slot in enumerate(list.__iter__(self)):
+			if slot is row or self._forks.get(slot) is row:
+				return idx
+		raise ValueError(f"{row} is not in table")
+
+	def _locate(self, row: T, idx: int) -> int:
+		# position of a row we remember to be at idx, unless the table has been reordered since
+		if 0 <= idx < len(self):
+			slot = list.__getitem__(self, idx)
+			if slot is row or self._peek(slot) is row:
+				return idx
+		return self._slot_index(row)
+
+	# index maintenance
+
+	def _index_key(self, row: T, **override) -> tuple:
+		return tuple(override[pkey] if pkey in override else getattr(row, pkey) for pkey in self.primary_keys)
+
+	def _index_add(self, slot: T):
+		if self.primary_keys and self.entity_index is not None:
+			self._index_put(self._index_key(self._peek(slot)), slot)
+		if self.range_indexes:
+			row = self._peek(slot)
+			for field, index in self.range_indexes.items():
+				index.add(slot, getattr(row, field))
+		if self.reference_indexes:
+			row = self._peek(slot)
+			for index in self.reference_indexes.values():
+				index.add(slot, row)
+		if self.id_allocators:
+			row = self._peek(slot)
+			for field, allocator in self.id_allocators.items():
+				allocator.add(getattr(row, field))
+
+	def _index_remove(self, slot: T):
+		if self.primary_keys and self.entity_index is not None:
+			self._index_drop(self._index_key(self._peek(slot)), slot)
+		if self.range_indexes:
+			row = self._peek(slot)
+			for field, index in self.range_indexes.items():
+				index.remove(slot, getattr(row, field))
+		if self.reference_indexes:
+			row = self._peek(slot)
+			for index in self.reference_indexes.values():
+				index.remove(slot, row)
+		if self.id_allocators:
+			row = self._peek(slot)
+			for field, allocator in self.id_allocators.items():
+				allocator.remove(getattr(row, field))
+
+	def _index_put(self, key: tuple, slot: T):
+		# a row that comes with a key that's already taken doesn't replace the row found by it
+		if self.entity_index.setdefault(key, slot) is not slot:
+			self._shadowed.setdefault(key, []).append(slot)
+
+	def _index_drop(self, key: tuple, slot: T) -> bool:
+		# returns whether the row was indexed under the key at all, another row with the key takes its place
+		shadowed = self._shadowed.get(key) if self._shadowed else None
+		if self.entity_index.get(key) is slot:
+			if shadowed:
+				self.entity_index[key] = shadowed.pop(0)
+				if not shadowed:
+					del self._shadowed[key]
+			else:
+				del self.entity_index[key]
+			return True
+		if shadowed and slot in shadowed:
+			shadowed.remove(slot)
+			if not shadowed:
+				del self._shadowed[key]
+			return True
+		return False
+
+	def _reindex(self, row: T, field: str, old):
+		# a primary key of the row has changed, only move it if it was indexed under the old key
+		if self.entity_index is None:
+			return
+		slot = self._slot(row)
+		if self._index_drop(self._index_key(row, **{field: old}), slot):
+			self._index_put(self._index_key(row), slot)
+			if self.id_allocators and field in self.id_allocators:
+				self.id_allocators[field].move(old, getattr(row, field))
+
+	# every structural change goes through these two
+
+	def _insert_rows(self, idx: int, rows: list[T]):
+		self._before_change()
+		self._reorder()
+		list.__setitem__(self, slice(idx, idx), rows)
+		for offset, row in enumerate(rows):
+			self._index_add(row)
+			if self._game_data is not None:
+				self._game_data._row_inserted(self, idx + offset, row)
+
+	def _delete_rows(self, idx: int, count: int):
+		self._before_change()
+		self._reorder()
+		slots = list.__getitem__(self, slice(idx, idx + count))
+		rows = [self._peek(slot) for slot in slots]
+		for slot in slots:
+			self._index_remove(slot)
+		self._drop_forks(slots)
+		list.__delitem__(self, slice(idx, idx + count))
+		if self._game_data is not None:
+			# logged back to front, so that undoing puts them back in order
+			for offset in reversed(range(len(rows))):
+				self._game_data._row_deleted(self, idx + offset, rows[offset])
+
+	def _delete_many(self, rows: list[T]) -> list[T]:
+		# like deleting them one by one (and logged that way, back to front), but in a single pass over the table
+		# rows that aren't in the table are ignored, returns the ones removed
+		targets = set(rows)
+		forks = self._forks or {}
+		positions = [idx for idx, slot in enumerate(list.__iter__(self)) if slot in targets or forks.get(slot) in targets]
+		if not positions:
+			return []
+		self._before_change()
+		self._reorder()
+		slots = [list.__getitem__(self, idx) for idx in positions]
+		removed = [self._peek(slot) for slot in slots]
+		for slot in slots:
+			self._index_remove(slot)
+		self._drop_forks(slots)
+		doomed = set(positions)
+		list.__setitem__(self, slice(None), [slot for idx, slot in enumerate(list.__iter__(self)) if idx not in doomed])
+		if self._game_data is not None:
+			for idx, row in reversed(list(zip(positions, removed))):
+				self._game_data._row_deleted(self, idx, row)
+		return removed
+
+	def _position(self, idx: int) -> int:
+		if idx < 0:
+			idx += len(self)
+		if not 0 <= idx < len(self):
+			raise IndexError("table index out of range")
+		return idx
+
+	# list interface
+
+	def __getitem__(self, item):
+		result = list.__getitem__(self, item)
+		if self._parent is None:
+			return result
+		if isinstance(item, slice):
+			return [self._own(row) for row in result]
+		return self._own(result)
+
+	def __iter__(self):
+		if self._parent is None:
+			return list.__iter__(self)
+		return (self._own(row) for row in list.__iter__(self))
+
+	def __contains__(self, row):
+		try:
+			self._slot_index(row)
+			return True
+		except ValueError:
+			return False
+
+	def index(self, row, *args):
+		if args:
+			return list.index(self, row, *args)
+		return self._slot_index(row)
+
+	def __setitem__(self, key, value):
+		if isinstance(key, slice):
+			start, stop, step = key.indices(len(self))
+			rows = list(value)
+			if step == 1:
+				self._delete_rows(start, max(0, stop - start))
+				self._insert_rows(start, rows)
+				return
+			positions = range(start, stop, step)
+			if len(positions) != len(rows):
+				raise ValueError(f"attempt to assign sequence of size {len(rows)} to extended slice of size {len(positions)}")
+			for idx, row in zip(positions, rows):
+				self._delete_rows(idx, 1)
+				self._insert_rows(idx, [row])
+		else:
+			idx = self._position(key)
+			self._delete_rows(idx, 1)
+			self._insert_rows(idx, [value])
+
+	def __delitem__(self, key):
+		if isinstance(key, slice):
+			start, stop, step = key.indices(len(self))
+			if step == 1:
+				self._delete_rows(start, max(0, stop - start))
+			else:
+				for idx in sorted(range(start, stop, step), reverse=True):
+					self._delete_rows(idx, 1)
+		else:
+			self._delete_rows(self._position(key), 1)
+
+	def append(self, row: T):
+		self._insert_rows(len(self), [row])
+
+	def extend(self, rows):
+		self._insert_rows(len(self), list(rows))
+
+	def __iadd__(self, rows):
+		self.extend(rows)
+		return self
+
+	def clear(self):
+		del self[:]
+
+	def insert(self, idx: int, row: T):
+		if idx < 0:
+			idx = max(0, idx + len(self))
+		self._insert_rows(min(idx, len(self)), [row])
+
+	def remove(self, row: T):
+		del self[self._slot_index(row)]
+
+	def pop(self, idx: int = -1) -> T:
+		row = self[idx]
+		del self[idx]
+		return row
+
+	def sort(self, *, key=None, reverse=False):
+		self._before_change()
+		self._reorder()
+		if key is not None and self._parent is not None:
+			list.sort(self, key=lambda row: key(self._peek(row)), reverse=reverse)
+		else:
+			list.sort(self, key=key, reverse=reverse)
+
+	def reverse(self):
+		self._before_change()
+		self._reorder()
+		list.reverse(self)
+
+
+def _unpickle_table(entity_type: Type[Entity], name: str, raw: bytes) -> Table:
+	return Table(raw_bytes=raw, entity_type=entity_type, game_data=None, name=name)
+
+
+def _unpickle_game_data(game_data_class: Type['GameData'], raw: bytes, validation: str) -> 'GameData':
+	return game_data_class(raw, verify=False, validation=validation)
+
 
 class TableDefinition:
 	# this is the equivalent of a field
@@ -110,11 +788,82 @@ class TableDefinition:
 		return Table(entity_type=self.entity_type, offset=self.offset, rows=rows)
 
 
+class Schema:
+	# everything about the tables of a GameData class that doesn't depend on the loaded data, compiled once per class
+	table_info: dict[str, type] # table name -> Table[entity type] annotation
+	entity_types: dict[str, Type[Entity]]
+	table_names: dict[Type[Entity], str]
+	relations: dict[Type[Entity], dict[str, Relation]] # outgoing relations of each entity type
+	referrers: dict[str, list[Relation]] # relations pointing at each table
+	# per table, where rows referencing one of its rows are: (table, their fields, our fields, our constants, their constants)
+	references: dict[str, list[tuple[str, tuple, tuple, dict, dict]]]
+	# per table, rows that belong to one of its rows (see Relation.owned) and go with it on a cascading delete: (table, their fields, our fields, their constants)
+	children: dict[str, list[tuple[str, tuple, tuple, dict]]]
+
+	def __init__(self, game_data_class: Type['GameData']):
+		# walking the class dicts, since cls.__annotations__ on a subclass without annotations would create an empty one
+		annotations = {}
+		for klass in reversed(game_data_class.__mro__):
+			annotations.update(klass.__dict__.get('__annotations__', {}))
+		self.table_info = {name: annot for name, annot in annotations.items() if get_origin(annot) is Table}
+		self.entity_types = {name: get_args(annot)[0] for name, annot in self.table_info.items()}
+		self.table_names = {entity_type: name for name, entity_type in self.entity_types.items()}
+
+		self.relations = {}
+		self.referrers = {name: [] for name in self.entity_types}
+		self.references = {name: [] for name in self.entity_types}
+		self.children = {name: [] for name in self.entity_types}
+		for table_name, entity_type in self.entity_types.items():
+			self.relations[entity_type] = entity_type._relations
+			for relation in entity_type._relations.values():
+				if relation.table_name not in self.entity_types:
+					raise ValueError(f"{entity_type.__name__}.{relation.name} refers to table {relation.table_name!r}, which {game_data_class.__name__} doesn't have")
+				relation._compile(self.entity_types[relation.table_name])
+				self.referrers[relation.table_name].append(relation)
+				self._add_references(table_name, entity_type, relation)
+
+	def _add_references(self, table_name: str, entity_type: Type[Entity], relation: Relation):
+		for mapping in (relation.mapping, relation.fallback_mapping):
+			variable = {key: source for key, source in mapping.items() if isinstance(source, str)}
+			constants = {key: source for key, source in mapping.items() if not isinstance(source, str)}
+			if not variable:
+				continue
+			if relation.multiple or all(source in entity_type._primary for source in variable.values()):
+				# children or optional rows of ours, they are the ones holding the reference
+				self.references[table_name].append((relation.table_name, tuple(variable), tuple(variable.values()), {}, constants))
+			else:
+				self.references[relation.table_name].append((table_name, tuple(variable.values()), tuple(variable), constants, {}))
+			if relation.owned:
+				self.children[table_name].append((relation.table_name, tuple(variable), tuple(variable.values()), constants))
+
+
 class GameData:
 	_header: bytearray
 	_offsets: dict = {}
 	_length: int = None
 	_md5: str = None
+	_fingerprint: str = None # see versions.fingerprint, much cheaper to check than the md5
+
+	# copy-on-write snapshots
+	_parent: 'GameData' = None
+	_epoch: int = 0 # bumped by every snapshot, rows written for the first time after that get preserved
+	_snapshots: list = None # weak references to snapshots taken from this instance
+
+	_history: ChangeLog = None
+	_validation: Validation = Validation.TABLE
+	_bound: 'GameData' = None # unpickled rows are attached to this one, see bind
+	_views: dict[str, View] = None
+	_read_only: bool = False # every write is refused (in _before_write), see SharedGameData
+
+	# partial loading
+	_source: bytes | str | PathLike[bytes] = None
+	_unloaded: dict[str, tuple[int, int]] = None # table name -> (offset, length) in the source, including header
+
+	# in place saving
+	_layout: dict[str, tuple[int, int]] = None # table name -> (offset, length) of the body in the source
+	_base: dict = None # the file header, and rows where the file differs from the loaded ones after save_inplace: (table name, row number) -> bytes
+	_base_md5: str = None # of the whole file on disk we can patch, i.e. the one loaded or last saved
+	_base_size: int = None
 
 	spells: Table[Spell]
 	spell_names: Table[SpellName]
@@ -166,57 +915,200 @@ class GameData:
 	upgrades: Table[Upgrade]
 	item_sets: Table[ItemSet]
 
-	def table_info(self):
-		return {name: annot for name, annot in self.__annotations__.items() if get_origin(annot) is Table}
+	@classmethod
+	def schema(cls) -> Schema:
+		# per class, not inherited
+		schema = cls.__dict__.get('_schema')
+		if schema is None:
+			schema = Schema(cls)
+			cls._schema = schema
+		return schema
+
+	@classmethod
+	def table_info(cls):
+		return cls.schema().table_info
 
 	def tables(self):
-		return {name: getattr(self, name) for name in self.table_info()}
+		return {name: getattr(self, name) for name in self.schema().table_info}
 
 	def get_table(self, entity_type: Type[Entity]) -> Table[Entity]:
-		for name, annot in self.table_info().items():
-			if get_args(annot)[0] is entity_type:
-				return self.tables()[name]
+		name = self.schema().table_names.get(entity_type)
+		if name:
+			return getattr(self, name)
+
+	def _table_name(self, entity_type: Type[Entity]) -> str:
+		return self.schema().table_names.get(entity_type)
 
-	def __init__(self, from_input: bytes | str | PathLike[bytes]):
+	def __init__(self, from_input: bytes | str | PathLike[bytes], tables: Iterable[str] = None, verify: bool = True, validation: Validation | str = Validation.TABLE, progress: Callable[[Progress], None] = None):
+		# tables: only parse these, the rest is skipped and kept as it is in the file until needed
+		# verify: check length and checksum of the known version (not needed if the version was already identified)
+		# validation: how thoroughly tables are checked when they are read and written, see Validation
+		# progress: called after every table, can stop the loading by raising
+		self._history = ChangeLog()
+		self._validation = Validation(validation)
+		self._layout = {}
+		self._base = {}
 		if isinstance(from_input, PathLike) or isinstance(from_input, str):
-			with open(from_input, 'rb') as fd:
-				raw = fd.read()
+			self._source = from_input
+		elif tables is not None:
+			# only kept around if we might need to load from it later
+			self._source = bytes(from_input)
+
+		if tables is None:
+			if self._source is not None:
+				with self._open_source() as fd:
+					raw = fd.read()
+			else:
+				raw = bytes(from_input)
+			if self._md5 and verify:
+				hsh = hashlib.md5()
+				hsh.update(raw)
+				assert hsh.hexdigest() == self._md5
+			fd = io.BytesIO(raw)
 		else:
-			raw = from_input
-
-		raw = bytearray(raw)
-		if self._length:
-			assert self._length == len(raw)
-		if self._md5:
-			hsh = hashlib.md5()
-			hsh.update(raw)
-			assert hsh.hexdigest() == self._md5
-		offset = 0
+			tables = set(tables)
+			unknown = tables - self.table_info().keys()
+			if unknown:
+				raise ValueError(f"Unknown tables: {', '.join(sorted(unknown))}")
+			self._unloaded = {}
+			fd = self._open_source()
 
-		# header
-		self._header = raw[0:20]
-		offset += 20
+		with fd:
+			file_size = fd.seek(0, io.SEEK_END)
+			fd.seek(0)
+			if self._length and verify:
+				assert self._length == file_size
+			offset = 0
 
-		for table_name, table_definition in self.table_info().items():
-			# guaranteed in correct order, PEP 468
+			# header
+			self._header = bytearray(fd.read(20))
+			self._base['header'] = bytes(self._header)
+			offset += 20
+			rows_done = 0
 
-			table_entity_type: Type[Entity] = get_args(table_definition)[0]
+			for table_name, table_definition in self.table_info().items():
+				# guaranteed in correct order, PEP 468
 
-			# need to already read the header so we know how many bytes to send to the table init
-			table_header = raw[offset: offset+12]
-			table_size_bytes = int.from_bytes(table_header[6: 10], byteorder='little', signed=False)
+				table_entity_type: Type[Entity] = get_args(table_definition)[0]
 
-			offset += 12
-			if table_name in self._offsets:
-				assert offset == self._offsets[table_name]
-			table_body = raw[offset: offset+table_size_bytes]
-			table = Table(raw_bytes=table_header + table_body, entity_type=table_entity_type, game_data=self)
+				# need to already read the header so we know how many bytes to send to the table init
+				table_header = bytearray(fd.read(12))
+				table_size_bytes = int.from_bytes(table_header[6: 10], byteorder='little', signed=False)
+
+				offset += 12
+				if table_name in self._offsets:
+					assert offset == self._offsets[table_name]
+				self._layout[table_name] = (offset, table_size_bytes)
+				if tables is None or table_name in tables:
+					table_body = fd.read(table_size_bytes)
+					table = Table(raw_bytes=table_header + table_body, entity_type=table_entity_type, game_data=self, name=table_name)
+					setattr(self, table_name, table)
+					rows_done += len(table)
+				else:
+					self._unloaded[table_name] = (offset - 12, table_size_bytes + 12)
+					fd.seek(table_size_bytes, io.SEEK_CUR)
+
+				offset += table_size_bytes
+				if progress is not None:
+					progress(Progress(table_name, offset, file_size, rows_done))
+
+			assert offset == file_size
+
+		if tables is None:
+			self._base_md5 = hashlib.md5(raw).hexdigest()
+		else:
+			from tirganach.versions import _md5
+			self._base_md5 = _md5(self._source)
+		self._base_size = file_size
+
+	def __reduce__(self):
+		# the bytes it would save as, so a copy costs one parse on the other side (history and snapshots stay here)
+		return _unpickle_game_data, (self.__class__, self._to_bytes(), self._validation.value)
+
+	def bind(self) -> 'GameData':
+		# rows unpickled in this process (e.g. arguments of a worker task) will belong to this GameData
+		GameData._bound = self
+		return self
+
+	def _detach_source(self, filename):
+		# the file skipped tables are read from (ours or that of a GameData we are a snapshot of) is about to be
+		# overwritten, so its current content is kept in memory from now on
+		game_data = self
+		while game_data is not None:
+			source = game_data._source
+			if game_data._unloaded and not isinstance(source, bytes) and os.path.exists(filename) and os.path.samefile(source, filename):
+				with game_data._open_source() as fd:
+					game_data._source = fd.read()
+			game_data = game_data._parent
+
+	def _open_source(self) -> BinaryIO:
+		if isinstance(self._source, bytes):
+			return io.BytesIO(self._source)
+		return open(self._source, 'rb')
+
+	def _unloaded_bytes(self, table_name: str) -> bytes:
+		# header and body of a skipped table, exactly as in the source
+		offset, length = self._unloaded[table_name]
+		with self._open_source() as fd:
+			fd.seek(offset)
+			return fd.read(length)
 
-			offset += table_size_bytes
+	def _load_table(self, table_name: str) -> Table:
+		table_entity_type: Type[Entity] = self.schema().entity_types[table_name]
+		raw = bytearray(self._unloaded_bytes(table_name))
+		table = Table(raw_bytes=raw, entity_type=table_entity_type, game_data=self, name=table_name)
+		del self._unloaded[table_name]
+		setattr(self, table_name, table)
+		return table
 
-			setattr(self, table_name, table)
+	def _table_bytes(self, table_name: str) -> bytes:
+		# tables that were never loaded (or never touched in a snapshot) are written back without parsing them
+		if table_name in self.__dict__:
+			return self.__dict__[table_name]._to_bytes()
+		if self._unloaded and table_name in self._unloaded:
+			return self._unloaded_bytes(table_name)
+		if self._parent is not None:
+			return self._parent._table_bytes(table_name)
+		return getattr(self, table_name)._to_bytes()
 
-		assert offset == len(raw)
+	def _table_digest(self, table_name: str) -> bytes:
+		if table_name in self.__dict__:
+			return self.__dict__[table_name].digest()
+		if self._unloaded and table_name in self._unloaded:
+			# same as Table.digest, straight from the bytes
+			raw = self._unloaded_bytes(table_name)
+			row_length = self.schema().entity_types[table_name]._length()
+			blocks = []
+			for start in range(12, len(raw), row_length * DIGEST_BLOCK):
+				hsh = hashlib.md5()
+				for offset in range(start, min(len(raw), start + row_length * DIGEST_BLOCK), row_length):
+					hsh.update(hashlib.md5(raw[offset: offset+row_length]).digest())
+				blocks.append(hsh.digest())
+			return hashlib.md5(bytes(raw[0:12]) + b''.join(blocks)).digest()
+		if self._parent is not None:
+			return self._parent._table_digest(table_name)
+		return getattr(self, table_name).digest()
+
+	def digest(self) -> bytes:
+		# equal for two GameData if and only if they would save the same file (barring hash collisions)
+		hsh = hashlib.md5(self._header)
+		for table_name in self.schema().table_info:
+			hsh.update(self._table_digest(table_name))
+		return hsh.digest()
+
+	def changes(self) -> dict[str, dict[str, list[Entity]]]:
+		# per table, rows that were inserted, deleted or modified since loading the file
+		result = self._parent.changes() if self._parent is not None else {}
+		for table_name in self.schema().table_info:
+			table = self.__dict__.get(table_name)
+			if table is None:
+				continue
+			changes = table.changes()
+			if any(changes.values()):
+				result[table_name] = changes
+			else:
+				result.pop(table_name, None)
+		return result
 
 	def _to_bytes(self):
 
@@ -228,18 +1120,460 @@ class GameData:
 		offset += 20
 
 		for table_name, table_definition in self.table_info().items():
-			table_entity_type: Type[Entity] = get_args(table_definition)[0]
-			table_instance: Table = getattr(self, table_name)
-			table_raw = table_instance._to_bytes()
+			table_raw = self._table_bytes(table_name)
 			result += table_raw
 			offset += len(table_raw)
 			assert offset == len(result)
 
 		return bytes(result)
 
-	def save(self, filename):
+	def save(self, filename, progress: Callable[[Progress], None] = None):
+		# progress: called after every table, can stop the saving by raising (leaving an incomplete file)
+		# everything is read before the file is opened, it might be the one skipped tables come from
+		self._detach_source(filename)
+		if progress is None:
+			data = self._to_bytes()
+			with open(filename, 'wb') as fd:
+				fd.write(data)
+			self._rebase(hashlib.md5(data).hexdigest(), len(data))
+			return
+		tables = [(table_name, self._table_bytes(table_name)) for table_name in self.table_info()]
+		bytes_total = len(self._header) + sum(len(data) for table_name, data in tables)
+		hsh = hashlib.md5(self._header)
 		with open(filename, 'wb') as fd:
-			fd.write(self._to_bytes())
+			fd.write(self._header)
+			bytes_done = len(self._header)
+			rows_done = 0
+			for table_name, data in tables:
+				fd.write(data)
+				hsh.update(data)
+				bytes_done += len(data)
+				rows_done += (len(data) - 12) // self.schema().entity_types[table_name]._length()
+				progress(Progress(table_name, bytes_done, bytes_total, rows_done))
+		self._rebase(hsh.hexdigest(), bytes_total)
+
+	# asyncio - the work runs in a thread, progress is reported on the event loop
+	# cancelling the awaiting task stops the thread at the next table
+
+	@staticmethod
+	async def _in_thread(work: Callable, progress: Callable[[Progress], None] = None):
+		loop = asyncio.get_running_loop()
+		cancelled = threading.Event()
+
+		def report(event: Progress):
+			if cancelled.is_set():
+				raise Cancelled()
+			if progress is not None:
+				loop.call_soon_threadsafe(progress, event)
+
+		try:
+			return await loop.run_in_executor(None, work, report)
+		except asyncio.CancelledError:
+			cancelled.set()
+			raise
+
+	@classmethod
+	async def aload(cls, source: bytes | str | PathLike[bytes], progress: Callable[[Progress], None] = None, **kwargs) -> 'GameData':
+		# kwargs are passed on, e.g. tables
+		return await cls._in_thread(lambda report: cls(source, progress=report, **kwargs), progress)
+
+	async def asave(self, filename, progress: Callable[[Progress], None] = None):
+		# written next to the target first, so a cancelled save doesn't leave half a file behind
+		# the GameData shouldn't be changed while saving
+		tmp_filename = f"{filename}.tmp"
+
+		def work(report):
+			try:
+				self.save(tmp_filename, progress=report)
+			except BaseException:
+				if os.path.exists(tmp_filename):
+					os.remove(tmp_filename)
+				raise
+			self._detach_source(filename)
+			os.replace(tmp_filename, filename)
+
+		await self._in_thread(work, progress)
+
+	def save_inplace(self, filename) -> bool:
+		# only writes the rows that differ from the file, if it's still the one we loaded or last saved (all of it, not a sample)
+		# otherwise, or if any table changed its size, the whole file is written - returns whether it could be patched
+		patches = self._patches() if self._layout is not None else None
+		if patches is None or not os.path.exists(filename) or os.path.getsize(filename) != self._base_size:
+			self.save(filename)
+			return False
+		with open(filename, 'r+b') as fd:
+			current = bytearray(fd.read())
+			if hashlib.md5(current).hexdigest() == self._base_md5:
+				# adjacent rows in one write
+				batches = []
+				for offset, data, key in sorted(patches, key=lambda patch: patch[0]):
+					if batches and batches[-1][0] + len(batches[-1][1]) == offset:
+						batches[-1][1] += data
+					else:
+						batches.append([offset, bytearray(data)])
+				for offset, data in batches:
+					fd.seek(offset)
+					fd.write(data)
+					current[offset: offset+len(data)] = data
+			else:
+				current = None
+		if current is None:
+			self.save(filename)
+			return False
+
+		for offset, data, key in patches:
+			self._base[key] = data
+		self._base_md5 = hashlib.md5(current).hexdigest()
+		return True
+
+	def _rebase(self, md5: str, size: int):
+		# a file now holds exactly what we have, from now on that's what save_inplace patches
+		if self._layout is None:
+			return
+		self._base['header'] = bytes(self._header)
+		layout = {}
+		offset = 20
+		for table_name, (old_offset, length) in self._layout.items():
+			offset += 12
+			table = self._loaded_table(table_name)
+			if table is not None:
+				patches = self._table_patches(table_name, table, old_offset, length)
+				if patches is None:
+					# resized, the rows no longer line up with the ones we loaded
+					length = len(table) * table.entity_type._length()
+					for idx, slot in enumerate(list.__iter__(table)):
+						self._base[(table_name, idx)] = table._peek(slot)._to_bytes()
+				else:
+					for patch_offset, data, key in patches:
+						self._base[key] = data
+			layout[table_name] = (offset, length)
+			offset += length
+		self._layout = layout
+		self._base_md5 = md5
+		self._base_size = size
+
+	def _patches(self) -> list[tuple[int, bytes, object]] | None:
+		# (absolute offset, bytes, base key) for everything that differs from the file, None if a table was resized
+		patches = []
+		header = bytes(self._header)
+		if header != self._base['header']:
+			patches.append((0, header, 'header'))
+		for table_name, (offset, length) in self._layout.items():
+			table = self._loaded_table(table_name)
+			if table is None:
+				continue
+			table_patches = self._table_patches(table_name, table, offset, length)
+			if table_patches is None:
+				return None
+			patches += table_patches
+		return patches
+
+	def _table_patches(self, table_name: str, table: Table, offset: int, length: int) -> list[tuple[int, bytes, object]] | None:
+		row_length = table.entity_type._length()
+		if len(table) * row_length != length:
+			return None
+		patches = []
+		for idx, slot in enumerate(list.__iter__(table)):
+			base = self._base.get((table_name, idx))
+			row = table._peek(slot)
+			if base is None:
+				loaded = table._loaded[idx]
+				if row is loaded and not row._dirty:
+					continue
+				base = loaded._raw
+			data = row._to_bytes()
+			if data != base:
+				patches.append((offset + idx * row_length, data, (table_name, idx)))
+		return patches
+
+	def referrers(self, entity: Entity) -> dict[str, list[Entity]]:
+		# every row with a relation to this one (or listed by one of its relations), per table
+		# the indexes are built on first use and then kept up to date
+		result = {}
+		for table_name, their_fields, our_fields, our_constants, their_constants in self.schema().references[self._table_name(entity.__class__)]:
+			if any(getattr(entity, field) != value for field, value in our_constants.items()):
+				continue
+			table = getattr(self, table_name)
+			found = result.setdefault(table_name, {})
+			for slot in table._reference_index(their_fields).get(tuple(getattr(entity, field) for field in our_fields)):
+				if slot in found or slot is entity:
+					continue
+				row = table._peek(slot)
+				if all(getattr(row, field) == value for field, value in their_constants.items()):
+					found[slot] = table._own(slot)
+		return {table_name: list(rows.values()) for table_name, rows in result.items() if rows}
+
+	def delete(self, entities: Entity | Iterable[Entity], cascade: bool = True) -> dict[str, list[Entity]]:
+		# with cascade, rows belonging to the deleted ones (the rows their owned relations find) are deleted as well,
+		# and so on; references that are all 0 mean "none" and own nothing
+		# one step to undo, one pass per table, returns the removed rows per table
+		schema = self.schema()
+		pending = [entities] if isinstance(entities, Entity) else list(entities)
+		doomed = {}
+		while pending:
+			row = pending.pop()
+			table_name = self._table_name(row.__class__)
+			rows = doomed.setdefault(table_name, {})
+			if row in rows:
+				continue
+			rows[row] = None
+			if not cascade:
+				continue
+			for child_table, their_fields, our_fields, their_constants in schema.children[table_name]:
+				key = tuple(getattr(row, field) for field in our_fields)
+				if not any(key):
+					continue
+				table = getattr(self, child_table)
+				for slot in table._reference_index(their_fields).get(key):
+					child = table._peek(slot)
+					if all(getattr(child, field) == value for field, value in their_constants.items()):
+						pending.append(table._own(slot))
+		result = {}
+		with self.transaction():
+			for table_name, rows in doomed.items():
+				removed = getattr(self, table_name)._delete_many(list(rows))
+				if removed:
+					result[table_name] = removed
+		return result
+
+	# integrity
+
+	def check_integrity(self) -> dict[str, list[Entity]]:
+		# rows whose references (the mappings of their relations) don't find anything, per relation ('Entity.relation')
+		# only real foreign keys count: relations listing children (multiple=True) or looking up by the row's own
+		# primary key are optional, and references that are all 0 mean "none"
+		schema = self.schema()
+		target_keys = {}
+		result = {}
+		for table_name, entity_type in schema.entity_types.items():
+			relations = [
+				relation for relation in entity_type._relations.values()
+				if relation._lookups and not relation.multiple
+				and not all(source in entity_type._primary for source in relation.mapping.values() if isinstance(source, str))
+			]
+			if not relations:
+				continue
+			table = getattr(self, table_name)
+			rows = [table._peek(slot) for slot in list.__iter__(table)]
+			for relation in relations:
+				dangling = rows
+				for keys, sources, indexed in relation._lookups:
+					fields = [source for source in sources if isinstance(source, str)]
+					if not fields:
+						continue
+					if (relation.table_name, keys) not in target_keys:
+						target = getattr(self, relation.table_name)
+						target_keys[(relation.table_name, keys)] = {tuple(getattr(target._peek(slot), key) for key in keys) for slot in list.__iter__(target)}
+					existing = target_keys[(relation.table_name, keys)]
+					dangling = [
+						row for row in dangling
+						if any(getattr(row, field) for field in fields)
+						and tuple(getattr(row, source) if isinstance(source, str) else source for source in sources) not in existing
+					]
+				if dangling:
+					result[f"{entity_type.__name__}.{relation.name}"] = [table._own(row) for row in dangling]
+		return result
+
+	# materialized views
+
+	def materialize(self, name: str, table_name: str, build: Callable[[Entity], dict], depends: dict = None) -> View:
+		# see View, replaces a view of the same name
+		if self._views is None:
+			self._views = {}
+		view = self._views[name] = View(self, name, table_name, build, depends)
+		return view
+
+	def view(self, name: str) -> View:
+		return self._views[name]
+
+	def drop_view(self, name: str):
+		if self._views:
+			self._views.pop(name, None)
+
+	def _touch_views(self, table_name: str, row: Entity):
+		for view in self._views.values():
+			view._touch(table_name, row)
+
+	# localisation
+
+	def set_texts(self, texts: dict, language: Language = None) -> list[Localisation]:
+		# texts: (text_id, language) -> text, entity -> text (its name, or whatever text it has)
+		# or (entity, relation name) -> text, language overrides the one the relation looks for
+		# the whole batch is checked first, then existing rows are changed and missing ones appended, as one step to undo
+		targets = {}
+		for key, text in texts.items():
+			target = self._text_key(key, language)
+			# 0 means no text, writing it would give one to every row without one
+			if target[0] == 0:
+				raise ValueError(f"{key!r} has no text_id")
+			targets[target] = text
+		keys = list(targets)
+		fields = Localisation._fields
+		text_ids = fields['text_id'].prepare_column([text_id for text_id, lang in keys])
+		values = fields['text'].prepare_column(list(targets.values()))
+		for lang in {lang for text_id, lang in keys}:
+			if not isinstance(lang, Language):
+				raise TypeError(f"Expected a Language, got {lang!r}")
+
+		table = self.localisation
+		rows = []
+		missing = []
+		with self.transaction():
+			for (text_id, lang), text in zip(zip(text_ids, (lang for text_id, lang in keys)), values):
+				found = table._lookup((lang, text_id))
+				if found:
+					found[0].text = text
+					rows.append(found[0])
+				else:
+					raw = bytearray(Localisation._length())
+					for field_name, value in (('text_id', text_id), ('language', lang), ('text', text)):
+						field_info = fields[field_name]
+						raw[field_info.offset: field_info.offset+field_info.len_bytes] = field_info.dump_bytes(value)
+					row = Localisation(bytes(raw), game_data=self)
+					missing.append(row)
+					rows.append(row)
+			table.extend(missing)
+		return rows
+
+	def _text_key(self, key, language: Language = None) -> tuple[int, Language]:
+		if isinstance(key, tuple) and not isinstance(key[0], Entity):
+			text_id, lang = key
+			return text_id, language or lang
+		entity, relation_name = key if isinstance(key, tuple) else (key, None)
+		relations = {name: relation for name, relation in entity._relations.items() if relation.table_name == 'localisation' and relation.attributes == ['text']}
+		if relation_name is None:
+			relation_name = 'name' if 'name' in relations else next(iter(relations), None)
+		relation = relations.get(relation_name)
+		if relation is None:
+			raise ValueError(f"{entity.__class__.__name__} has no text {relation_name or ''}")
+		mapping = relation.mapping
+		return getattr(entity, mapping['text_id']), language or mapping.get('language', Language.ENGLISH)
+
+	def memory_report(self) -> dict:
+		# bytes held per table: the table's lists, row objects with their dicts, decoded values per field type,
+		# raw row buffers and indexes - next to the size of the table in the file
+		# tables that aren't loaded (or a snapshot still reads from its parent) hold nothing here
+		seen = set()
+		tables = {}
+		for table_name, (offset, length) in (self._layout or {}).items():
+			table = self.__dict__.get(table_name)
+			if table is None:
+				tables[table_name] = {'rows': None, 'disk': 12 + length, 'total': 0}
+			else:
+				tables[table_name] = table._memory(seen)
+		return {
+			'tables': tables,
+			'disk': sum(report['disk'] for report in tables.values()) + 20,
+			'total': sum(report['total'] for report in tables.values()),
+		}
+
+	def _loaded_table(self, table_name: str) -> Table | None:
+		# the table as this instance sees it, None if it was never loaded (and so can't have changed)
+		if table_name in self.__dict__:
+			return self.__dict__[table_name]
+		if self._parent is not None:
+			return self._parent._loaded_table(table_name)
+		return None
+
+	# snapshots
+
+	def snapshot(self) -> 'GameData':
+		# tables are only copied (as a list of shared rows) when first accessed on the snapshot,
+		# rows only when first accessed through it
+		snapshot = object.__new__(self.__class__)
+		snapshot._header = bytearray(self._header)
+		snapshot._parent = self
+		snapshot._history = ChangeLog()
+		snapshot._validation = self._validation
+		snapshot._layout = self._layout
+		snapshot._base = dict(self._base) if self._base is not None else None
+		snapshot._base_md5 = self._base_md5
+		snapshot._base_size = self._base_size
+		self._epoch += 1
+		self._snapshots = [ref for ref in (self._snapshots or []) if ref() is not None]
+		self._snapshots.append(weakref.ref(snapshot))
+		return snapshot
+
+	def __getattr__(self, name):
+		# only called for missing attributes, i.e. tables that were skipped when loading
+		# or tables of a snapshot that haven't been touched yet
+		if self._unloaded and name in self._unloaded:
+			return self._load_table(name)
+		if self._parent is not None and name in self.table_info():
+			table = getattr(self._parent, name)._snapshot(self)
+			setattr(self, name, table)
+			return table
+		raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
+
+	def _live_snapshots(self):
+		for ref in self._snapshots or []:
+			snapshot = ref()
+			if snapshot is not None:
+				yield snapshot
+
+	def _fault_snapshots(self, table_name: str):
+		# a table is about to change, so snapshots that still read it from us need their own copy now
+		for snapshot in self._live_snapshots():
+			if table_name not in snapshot.__dict__:
+				getattr(snapshot, table_name)
+
+	# change log
+
+	@contextmanager
+	def transaction(self):
+		self._history.begin()
+		try:
+			yield self
+		except BaseException:
+			self._history.rollback()
+			raise
+		else:
+			self._history.commit()
+
+	def undo(self) -> bool:
+		return self._history.undo()
+
+	def redo(self) -> bool:
+		return self._history.redo()
+
+	def _after_write(self, row: Entity, field: str, old, new):
+		self._history.record(FieldChange(row, field, old, new))
+		# tables that aren't loaded (yet) can't contain the row
+		table = self.__dict__.get(self._table_name(row.__class__))
+		if table is not None:
+			table._touch(row)
+			if table.group_indexes:
+				table._regroup(field)
+			if row._fields[field].primary:
+				table._reindex(row, field, old)
+			if table.range_indexes and field in table.range_indexes:
+				table.range_indexes[field].move(table._slot(row), old, new)
+			if table.reference_indexes:
+				for index in table.reference_indexes.values():
+					if field in index.fields:
+						index.move(table._slot(row), row, field, old)
+		if self._views:
+			self._touch_views(self._table_name(row.__class__), row)
+
+	def _row_inserted(self, table: Table, idx: int, row: Entity):
+		self._history.record(RowInsert(table, idx, row))
+		if self._views:
+			self._touch_views(table.name, row)
+
+	def _row_deleted(self, table: Table, idx: int, row: Entity):
+		self._history.record(RowDelete(table, idx, row))
+		if self._views:
+			self._touch_views(table.name, row)
+
+	def _before_write(self, row: Entity):
+		if self._views:
+			self._touch_views(self._table_name(row.__class__), row)
+		if row._epoch == self._epoch:
+			return
+		row.__dict__['_epoch'] = self._epoch
+		table_name = self._table_name(row.__class__)
+		for snapshot in self._live_snapshots():
+			getattr(snapshot, table_name)._preserve(row)
 
 
 # gamedatas from different versions aren't actually structurally different, so we can just use the base class to load
@@ -0,0 +1,94 @@
+import hashlib
+import io
+from os import PathLike
+from typing import Type
+
+from tirganach.catalog import catalog, Catalog
+from tirganach.structure import GameData, GameData154, GameData154EN, GameData154RU, GameData154PL, GameData161
+
+
+# most specific first - versions with a checksum, then the ones that only know their layout
+known_versions: list[Type[GameData]] = [
+	GameData154EN,
+	GameData154RU,
+	GameData154PL,
+	GameData154,
+	GameData161,
+]
+
+FINGERPRINT_SAMPLE = 4096
+
+
+def register_version(game_data_class: Type[GameData]) -> Type[GameData]:
+	# can be used as class decorator
+	# a class needs at least a _length (and ideally _offsets) to be told apart, and _fingerprint or _md5 to be verified
+	if game_data_class not in known_versions:
+		known_versions.insert(0, game_data_class)
+	return game_data_class
+
+
+def _open_source(source: bytes | str | PathLike[bytes]):
+	if isinstance(source, PathLike) or isinstance(source, str):
+		return io.open(source, 'rb')
+	return io.BytesIO(source)
+
+
+def fingerprint(source: bytes | str | PathLike[bytes], entries: Catalog = None) -> str:
+	# md5 over the file header, all table headers and the first and last few KB of every table body
+	if entries is None:
+		entries = catalog(source)
+	hsh = hashlib.md5()
+	hsh.update(entries.header)
+	with _open_source(source) as fd:
+		for entry in entries.values():
+			head = min(entry.length, FINGERPRINT_SAMPLE)
+			tail = min(entry.length - head, FINGERPRINT_SAMPLE)
+			for offset, length in ((entry.header_offset, 12 + head), (entry.offset + entry.length - tail, tail)):
+				fd.seek(offset)
+				hsh.update(fd.read(length))
+	return hsh.hexdigest()
+
+
+def _md5(source: bytes | str | PathLike[bytes]) -> str:
+	hsh = hashlib.md5()
+	with _open_source(source) as fd:
+		for chunk in iter(lambda: fd.read(1 << 20), b''):
+			hsh.update(chunk)
+	return hsh.hexdigest()
+
+
+def _layout_matches(game_data_class: Type[GameData], entries: Catalog) -> bool:
+	if game_data_class._length is not None and game_data_class._length != entries.size:
+		return False
+	return all(table_name in entries and entries[table_name].offset == offset for table_name, offset in game_data_class._offsets.items())
+
+
+def identify(source: bytes | str | PathLike[bytes]) -> Type[GameData]:
+	entries = catalog(source)
+	candidates = [cls for cls in known_versions if _layout_matches(cls, entries)]
+
+	checked = [cls for cls in candidates if cls._fingerprint or cls._md5]
+	if checked:
+		file_fingerprint = fingerprint(source, entries)
+		for cls in checked:
+			if cls._fingerprint == file_fingerprint:
+				return cls
+		# only hash the whole file if there are versions we don't have a fingerprint for
+		unfingerprinted = [cls for cls in checked if not cls._fingerprint and cls._md5]
+		if unfingerprinted:
+			file_md5 = _md5(source)
+			for cls in unfingerprinted:
+				if cls._md5 == file_md5:
+					return cls
+
+	# same layout as a known version, but modified
+	for cls in candidates:
+		if not (cls._fingerprint or cls._md5):
+			return cls
+	return GameData
+
+
+def open(source: bytes | str | PathLike[bytes], **kwargs) -> GameData:
+	# kwargs are passed on to the GameData, e.g. tables
+	game_data_class = identify(source)
+	return game_data_class(source, verify=False, **kwargs)
@@ -0,0 +1,157 @@
+from typing import Callable, TYPE_CHECKING
+
+from tirganach.entities import Entity, Item, Creature
+
+if TYPE_CHECKING:
+	from .structure import GameData
+
+
+# denormalized records, one per row of a base table, built once and then only rebuilt for rows affected by changes
+# depends tells which changes affect which base rows, per table either
+#   {base field: field of the changed row} - base rows whose field matches, e.g. 'localisation': {'name_id': 'text_id'}
+#   or a function of the changed row returning the affected base row(s)
+# changes to tables that aren't declared there don't refresh anything
+
+class View:
+	name: str
+	table_name: str
+	build: Callable[[Entity], dict]
+	depends: dict[str, dict | Callable]
+	records: dict[tuple, dict] # primary key of the base row -> record
+	_game_data: 'GameData'
+	_dirty: set # keys to rebuild
+	_pending: dict[str, set] # table name -> values of the changed rows, resolved to keys in bulk on refresh
+
+	def __init__(self, game_data: 'GameData', name: str, table_name: str, build: Callable[[Entity], dict], depends: dict = None):
+		self._game_data = game_data
+		self.name = name
+		self.table_name = table_name
+		self.build = build
+		self.depends = {}
+		table = getattr(game_data, table_name)
+		if not table.primary_keys:
+			raise ValueError(f"Table {table_name} has no primary key to identify records by")
+		for dependency, spec in (depends or {}).items():
+			if not callable(spec):
+				# sorted like the primary key, so matches on it can be used as keys directly
+				spec = dict(sorted(spec.items()))
+			self.depends[dependency] = spec
+		self._dirty = set()
+		self._pending = {}
+		self.records = {self._key(row): build(row) for row in table}
+
+	def __repr__(self):
+		return f"<[View] {self.name}: {len(self.records)} records>"
+
+	def _key(self, row: Entity) -> tuple:
+		return tuple(getattr(row, pkey) for pkey in row._primary)
+
+	def _touch(self, table_name: str, row: Entity):
+		# called before and after every change, so both the old and the new state are accounted for
+		if table_name == self.table_name:
+			self._dirty.add(self._key(row))
+		spec = self.depends.get(table_name)
+		if spec is None:
+			return
+		if callable(spec):
+			affected = spec(row)
+			for base_row in affected if isinstance(affected, (list, tuple)) else [affected] if affected is not None else []:
+				self._dirty.add(self._key(base_row))
+		else:
+			self._pending.setdefault(table_name, set()).add(tuple(getattr(row, field) for field in spec.values()))
+
+	def refresh(self) -> int:
+		# returns the number of records rebuilt (or removed)
+		table = getattr(self._game_data, self.table_name)
+		dirty = self._dirty
+		for table_name, values in self._pending.items():
+			base_fields = tuple(self.depends[table_name])
+			if base_fields == table.primary_keys:
+				dirty |= values
+			else:
+				dirty |= {self._key(row) for row in table if tuple(getattr(row, field) for field in base_fields) in values}
+		self._pending = {}
+		self._dirty = set()
+
+		for key in dirty:
+			found = table._lookup(key)
+			if found:
+				self.records[key] = self.build(found[0])
+			else:
+				self.records.pop(key, None)
+		return len(dirty)
+
+	def __getitem__(self, key) -> dict:
+		# by primary key (a tuple, or the value of a single field primary key) or by base row
+		if self._dirty or self._pending:
+			self.refresh()
+		if isinstance(key, Entity):
+			key = self._key(key)
+		elif not isinstance(key, tuple):
+			key = (key,)
+		return self.records[key]
+
+	def __iter__(self):
+		if self._dirty or self._pending:
+			self.refresh()
+		return iter(self.records.values())
+
+	def __len__(self):
+		if self._dirty or self._pending:
+			self.refresh()
+		return len(self.records)
+
+
+# the ones our tools keep rebuilding
+
+def _fields(row: Entity | None, exclude: tuple = ()) -> dict | None:
+	if row is None:
+		return None
+	return {field_name: getattr(row, field_name) for field_name in row._fields if field_name not in exclude}
+
+
+def _item_record(item: Item) -> dict:
+	return {
+		**item.info(),
+		'selling_price': item.selling_price,
+		'buying_price': item.buying_price,
+		'armor': _fields(item.armor, exclude=('item_id',)),
+		'weapon': _fields(item.weapon, exclude=('item_id',)),
+		'requirements': {r.requirement_school.name: r.level for r in item.requirements or []},
+		'set': item.item_set.description if item.item_set else None,
+	}
+
+
+def item_catalog(game_data: 'GameData') -> View:
+	return game_data.materialize('item_catalog', 'items', _item_record, depends={
+		'armor': {'item_id': 'item_id'},
+		'weapons': {'item_id': 'item_id'},
+		'item_requirements': {'item_id': 'item_id'},
+		'localisation': {'name_id': 'text_id'},
+		'item_sets': {'item_set_id': 'set_id'},
+	})
+
+
+def _unit_record(creature: Creature) -> dict:
+	stats = creature.stats
+	return {
+		'creature_id': creature.creature_id,
+		'name': creature.name,
+		'unit_handle': creature.unit_handle,
+		'experience': creature.experience,
+		'armor': creature.armor,
+		'stats': _fields(stats, exclude=('stats_id',)),
+		'skills': {s.skill_school.name: s.skill_level for s in stats.skills or []} if stats else {},
+		'spells': [s.spell_id for s in creature.spells or []],
+		'equipment': {e.equipment_slot.name: e.item_id for e in creature.equipment or []},
+	}
+
+
+def unit_sheet(game_data: 'GameData') -> View:
+	return game_data.materialize('unit_sheet', 'creatures', _unit_record, depends={
+		'creature_stats': {'stats_id': 'stats_id'},
+		'creature_skills': {'stats_id': 'stats_id'},
+		'creature_spells': {'creature_id': 'creature_id'},
+		'creature_equipment': {'creature_id': 'creature_id'},
+		'localisation': {'name_id': 'text_id'},
+	})